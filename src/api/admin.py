@@ -0,0 +1,20 @@
+"""
+Admin token check for /admin/reload and /corrections/accept.
+
+The token comes from `STDTEXT_ADMIN_TOKEN`. Without one configured these endpoints refuse every
+request: an accepted sentence ends up in the corpus and the PDG counts for good, and a reload
+loads the transformer, LM and lexicon again, so neither may be open to anonymous clients.
+"""
+
+import hmac
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+def require_admin(token: Optional[str], admin_token: Optional[str]) -> None:
+    """Raise 403 unless `admin_token` is configured and `token` matches it."""
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="admin endpoints are disabled; set STDTEXT_ADMIN_TOKEN")
+    if token is None or not hmac.compare_digest(token.encode("utf-8"), admin_token.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="invalid admin token")
@@ -8,10 +8,12 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from src.api.routes import router
+from src.api.routes import router, scheduler
 
 app = FastAPI(title="stdtext API", version="0.1.0")
 app.include_router(router)
+app.add_event_handler("startup", scheduler.start)
+app.add_event_handler("shutdown", scheduler.stop)
 
 def run():
     import uvicorn
@@ -0,0 +1,166 @@
+"""
+Versioned handle on the HybridModel, so retrained artifacts can be loaded without a restart.
+
+`reload()` builds a new model from the same artifact paths (the spaCy pipeline is shared and
+stays loaded) and swaps it in with a single assignment. A batch reads the active model once,
+so batches that started before the swap finish on the old model, which is freed as soon as the
+last of them returns. Every result carries the `model_version` that produced it: the generation
+and artifact hash, plus "+u<seq>" with the last online update applied to the model (see below).
+
+With `update_log`, the handle owns the OnlineUpdater (src/models/online_updates.py), so one log
+and one sequence serve every generation. `accept` is refused while a reload runs; the reload
+replays the updates its artifacts do not include into the new model before swapping it in.
+"""
+
+import gc
+import hashlib
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, List, NamedTuple, Optional
+
+from src.models.hybrid_model import HybridModel
+from src.models.lm_registry import DEFAULT_LOAD_METHOD, release
+from src.models.metrics import metrics
+from src.models.online_updates import OnlineUpdater, recover
+from src.nlp.spacy_pipeline import parse_many
+
+
+class ReloadInProgressError(Exception):
+    """Another reload is still building its model."""
+
+
+class UpdatesDisabledError(Exception):
+    """Online updates are not configured (no update log)."""
+
+
+class _Active(NamedTuple):
+    version: str
+    model: HybridModel
+    loaded_at: float
+
+
+class ModelHandle:
+    def __init__(self, update_log: Optional[str] = None, compact_every: int = 1000, **model_kwargs):
+        self.model_kwargs = model_kwargs
+        self._generation = 0
+        self._reload_lock = threading.Lock()
+        self.last_reload: Optional[Dict[str, object]] = None
+        pdg_path, vocab_path = model_kwargs["pdg_path"], model_kwargs.get("vocab_path")
+        if update_log:
+            # Finish an interrupted compaction before the artifacts are read
+            recover(update_log, pdg_path, vocab_path)
+        self._active = self._build()
+        self.updater: Optional[OnlineUpdater] = None
+        if update_log:
+            model = self._active.model
+            self.updater = OnlineUpdater(model.spellchecker, model.pdg, pdg_path, vocab_path, update_log, compact_every)
+            self.updater.replay()
+
+    def _build(self) -> _Active:
+        model = HybridModel(**self.model_kwargs)
+        self._generation += 1
+        digest = hashlib.sha1(model.artifact_version.encode("utf-8")).hexdigest()[:8]
+        return _Active(f"{self._generation}-{digest}", model, time.time())
+
+    @property
+    def model(self) -> HybridModel:
+        return self._active.model
+
+    def _version(self, active: _Active) -> str:
+        if self.updater is None:
+            return active.version
+        # Accepted corrections change vocabulary and PDG counts in place; seq numbers every one
+        return f"{active.version}+u{self.updater.log.seq}"
+
+    @property
+    def version(self) -> str:
+        return self._version(self._active)
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_lock.locked()
+
+    def reload(self) -> Dict[str, object]:
+        """Build a model from the current artifact files and swap it in; blocks until done."""
+        if not self._reload_lock.acquire(blocking=False):
+            raise ReloadInProgressError("a reload is already running")
+        began = time.perf_counter()
+        previous = self.version
+        try:
+            # Drop the registry entry so the KenLM binary is read again; the old model keeps
+            # its own reference until it is released below
+            release(self.model_kwargs["lm_path"], self.model_kwargs.get("lm_load_method", DEFAULT_LOAD_METHOD))
+            # Updates wait from before the artifacts are read until the new model is active
+            with self.updater.lock if self.updater else nullcontext():
+                active = self._build()
+                if self.updater:
+                    self.updater.rebind(active.model.spellchecker, active.model.pdg)
+                self._active = active
+            del active
+            gc.collect()
+            metrics.inc("model_reloads")
+            self.last_reload = {
+                "status": "ok",
+                "previous_version": previous,
+                "version": self.version,
+                "seconds": time.perf_counter() - began,
+            }
+        except Exception as exc:
+            self.last_reload = {"status": "failed", "version": previous, "error": str(exc)}
+            raise
+        finally:
+            self._reload_lock.release()
+        return self.last_reload
+
+    def info(self) -> Dict[str, object]:
+        active = self._active
+        artifacts = {}
+        for path in active.model.artifacts.paths:
+            try:
+                st = os.stat(path)
+                artifacts[path] = {"bytes": st.st_size, "mtime": st.st_mtime}
+            except OSError:
+                artifacts[path] = None
+        return {
+            "version": self._version(active),
+            "loaded_at": active.loaded_at,
+            "artifacts": artifacts,
+            "reloading": self.reloading,
+            "last_reload": self.last_reload,
+        }
+
+    def score_batch(self, sentences: List[str], **kwargs) -> List[dict]:
+        active = self._active
+        version, model = self._version(active), active.model
+        results = model.score_batch(sentences, **kwargs)
+        for result in results:
+            result["model_version"] = version
+        return results
+
+    def correct_nbest(self, sentence: str, k: int = 5) -> dict:
+        active = self._active
+        version, model = self._version(active), active.model
+        result = model.correct_nbest(sentence, k=k)
+        result["model_version"] = version
+        return result
+
+    def accept(self, sentence: str) -> dict:
+        """Learn vocabulary and PDG counts from a sentence the user accepted."""
+        if self.updater is None:
+            raise UpdatesDisabledError("online updates are disabled; set STDTEXT_UPDATE_LOG")
+        if self.reloading:
+            raise ReloadInProgressError("a reload is running; retry once it has finished")
+        with metrics.timer("accept"):
+            result = self.updater.accept(sentence, lambda texts: parse_many(texts, batch_size=self.model.batch_size))
+        # Read after the update: a reload that got in first has replayed it into its model
+        active = self._active
+        version, model = self._version(active), active.model
+        # Scores and suggestions computed before the update are stale
+        model.result_cache.clear()
+        result["model_version"] = version
+        return result
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return self._active.model.cache_stats()
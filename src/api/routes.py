@@ -1,19 +1,161 @@
-from fastapi import APIRouter
+import asyncio
+import os
+from typing import Optional
 
-from schemas import SentenceRequest, ScoreResponse
-from src.models.hybrid_model import HybridModel
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from schemas import (
+    AcceptRequest,
+    AcceptResponse,
+    BatchScoreItem,
+    BatchSentenceRequest,
+    CorrectRequest,
+    CorrectResponse,
+    SentenceRequest,
+    ScoreResponse,
+)
+from src.api.admin import require_admin
+from src.api.model_handle import ModelHandle, ReloadInProgressError, UpdatesDisabledError
+from src.api.scheduler import InferenceScheduler, QueueFullError, SchedulerClosedError
+from src.models.lm_registry import memory_report
+from src.models.metrics import metrics
 
 router = APIRouter()
 
-model = HybridModel(
+# Admin endpoints require this token in X-Admin-Token and are refused when it is not set
+ADMIN_TOKEN = os.environ.get("STDTEXT_ADMIN_TOKEN")
+
+# Versioned handle; /admin/reload swaps in a model built from the current artifact files
+model = ModelHandle(
     pdg_path="data/pdg/grammar_stats.json",
     lm_path="data/lm/my_corpus.bin",
     alpha=0.5,
     vocab_path="data/lm/lm_corpus.txt",
     correction_cutoff=0.82,
     lemma_path="data/lm/lemmas.json",
+    fast_path=os.environ.get("STDTEXT_FAST_PATH", "1") != "0",
+    nbest_beam_size=int(os.environ.get("STDTEXT_NBEST_BEAM", "16")),
+    max_nbest=int(os.environ.get("STDTEXT_MAX_NBEST", "10")),
+    update_log=os.environ.get("STDTEXT_UPDATE_LOG") or None,
+    compact_every=int(os.environ.get("STDTEXT_COMPACT_EVERY", "1000")),
 )
 
+# Started/stopped with the app (see src/api/main.py)
+scheduler = InferenceScheduler(
+    model,
+    workers=int(os.environ.get("STDTEXT_INFERENCE_WORKERS", "1")),
+    max_queue=int(os.environ.get("STDTEXT_MAX_QUEUE", "256")),
+    max_batch=int(os.environ.get("STDTEXT_MAX_BATCH", "32")),
+    batch_window_ms=float(os.environ.get("STDTEXT_BATCH_WINDOW_MS", "5")),
+    timeout_s=float(os.environ.get("STDTEXT_REQUEST_TIMEOUT_S", "30")),
+)
+
+
+async def _submit(texts: list[str], autocorrect: bool, timings: bool = False) -> list[dict]:
+    try:
+        return await scheduler.submit_many(texts, autocorrect=autocorrect, timings=timings)
+    except QueueFullError as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "1"})
+    except SchedulerClosedError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="scoring timed out")
+
+
 @router.post("/score", response_model=ScoreResponse)
-def score(req: SentenceRequest):
-    return model.score(req.text.lower(), autocorrect=req.autocorrect)
+async def score(req: SentenceRequest):
+    result = (await _submit([req.text.lower()], req.autocorrect, req.timings))[0]
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return result
+
+
+@router.post("/score/batch", response_model=list[BatchScoreItem])
+async def score_batch(req: BatchSentenceRequest):
+    results = await _submit([text.lower() for text in req.texts], req.autocorrect, req.timings)
+    return [{"error": r["error"]} if "error" in r else {"result": r} for r in results]
+
+
+@router.post("/correct", response_model=CorrectResponse)
+async def correct(req: CorrectRequest):
+    """Up to `k` alternative corrections of the text, each with LM, PDG and combined scores."""
+    try:
+        return await scheduler.call(model.correct_nbest, req.text.lower(), req.k)
+    except QueueFullError as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "1"})
+    except SchedulerClosedError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="correction timed out")
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/models/memory")
+def models_memory():
+    """Resident memory per loaded KenLM model."""
+    return memory_report()
+
+
+@router.get("/cache/stats")
+def cache_stats():
+    """Hit/miss/eviction counters for the result and suggestion caches."""
+    return model.cache_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latency histograms, counters and cache stats in Prometheus text format."""
+    return PlainTextResponse(metrics.render(model.cache_stats()), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/models/version")
+def models_version():
+    """Active model version, the artifact files it was built from and the last reload outcome."""
+    return model.info()
+
+
+@router.post("/corrections/accept", response_model=AcceptResponse)
+async def accept_correction(req: AcceptRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Learn from an accepted sentence: its words count into the spellchecker vocabulary and its
+    dependency triples into the PDG counts, without retraining or a reload. Requires the admin
+    token; refused when none is configured.
+    """
+    require_admin(x_admin_token, ADMIN_TOKEN)
+    try:
+        return await scheduler.call(model.accept, req.text.lower())
+    except QueueFullError as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "1"})
+    except UpdatesDisabledError as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+    except ReloadInProgressError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except SchedulerClosedError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="update timed out")
+
+
+@router.post("/admin/reload", status_code=202)
+async def reload_models(wait: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    Rebuild the model from the artifact files on disk and swap it in. Requests already being
+    scored finish on the old version. With `wait` the response is sent after the swap. Requires
+    the admin token; refused when none is configured.
+    """
+    require_admin(x_admin_token, ADMIN_TOKEN)
+    if model.reloading:
+        raise HTTPException(status_code=409, detail="a reload is already running")
+    pending = asyncio.get_running_loop().run_in_executor(None, model.reload)
+    if not wait:
+        # The outcome is reported by /models/version; retrieve it so a failure is not logged as unhandled
+        pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return {"status": "reloading", "version": model.version}
+    try:
+        return await pending
+    except ReloadInProgressError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"reload failed, still serving {model.version}: {exc}")
@@ -0,0 +1,204 @@
+"""
+Inference scheduler between the API routes and the HybridModel.
+
+Requests are queued on the event loop and coalesced into micro-batches: the first queued job
+opens a short window (`batch_window_ms`) during which further jobs join the batch, up to
+`max_batch` sentences. A request with more texts than `max_batch` is queued as several jobs,
+so no batch exceeds the cap and a large request does not hold a worker for its whole length.
+Batches run on a dedicated thread pool of `workers` threads, so CPU-bound inference never
+competes with more threads than configured. The queue is bounded to `max_queue` jobs; when a
+request does not fit, `submit` raises QueueFullError instead of letting latency grow without
+bound.
+
+Work that does not fit the micro-batches (n-best correction, accepted corrections) goes through
+`call`, which runs on the same pool and counts against the same `workers` limit. Calls waiting
+for a worker count against `max_queue` together with the queued jobs.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+
+class QueueFullError(Exception):
+    """The inference queue is full; the client should back off and retry."""
+
+
+class SchedulerClosedError(Exception):
+    """The scheduler is shutting down and no longer accepts work."""
+
+
+class _Job(NamedTuple):
+    texts: List[str]
+    autocorrect: bool
+    timings: bool
+    future: asyncio.Future
+
+
+class InferenceScheduler:
+    def __init__(
+        self,
+        model,
+        workers: int = 1,
+        max_queue: int = 256,
+        max_batch: int = 32,
+        batch_window_ms: float = 5.0,
+        timeout_s: Optional[float] = 30.0,
+    ):
+        self.model = model
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window_ms / 1000
+        self.timeout_s = timeout_s
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._running: set = set()
+        # `call`s waiting for a worker slot; they share the `max_queue` bound with queued jobs
+        self._waiting = 0
+        # Taken off the queue but not yet batched: waiting for a worker slot, or it would have
+        # pushed the previous batch past max_batch; it opens the next batch
+        self._next: Optional[_Job] = None
+        self._closed = True
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._slots = asyncio.Semaphore(self.workers)
+        self._closed = False
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self) -> None:
+        """Stop accepting work, finish everything already queued, then release the pool."""
+        if self._closed:
+            return
+        self._closed = True
+        await self._queue.join()
+        self._collector.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    def qsize(self) -> int:
+        queued = self._queue.qsize() if self._queue else 0
+        return queued + (self._next is not None) + self._waiting
+
+    def _check_room(self, jobs: int = 1) -> None:
+        if self.max_queue > 0 and self.qsize() + jobs > self.max_queue:
+            raise QueueFullError(f"inference queue is full ({self.max_queue} jobs)")
+
+    async def submit_many(
+        self,
+        texts: List[str],
+        autocorrect: bool = True,
+        timeout_s: Optional[float] = None,
+        timings: bool = False,
+    ) -> List[dict]:
+        """Queue texts for scoring and wait for their results (in input order)."""
+        if self._closed:
+            raise SchedulerClosedError("scheduler is not running")
+        texts = list(texts)
+        if not texts:
+            return []
+        chunks = [texts[i : i + self.max_batch] for i in range(0, len(texts), self.max_batch)]
+        # All or nothing: a request is never left partly queued
+        self._check_room(len(chunks))
+        loop = asyncio.get_running_loop()
+        futures = []
+        for chunk in chunks:
+            future = loop.create_future()
+            self._queue.put_nowait(_Job(chunk, autocorrect, timings, future))
+            futures.append(future)
+        timeout = self.timeout_s if timeout_s is None else timeout_s
+        # wait_for cancels the futures on timeout; the batch runner then skips those jobs
+        results = await asyncio.wait_for(asyncio.gather(*futures), timeout)
+        return [result for chunk in results for result in chunk]
+
+    async def submit(
+        self, text: str, autocorrect: bool = True, timeout_s: Optional[float] = None, timings: bool = False
+    ) -> dict:
+        return (await self.submit_many([text], autocorrect=autocorrect, timeout_s=timeout_s, timings=timings))[0]
+
+    async def call(self, fn, *args, timeout_s: Optional[float] = None):
+        """
+        Run `fn(*args)` on the inference pool once a worker slot is free and return its result.
+        Raises QueueFullError when `max_queue` jobs and calls are already waiting.
+        """
+        if self._closed:
+            raise SchedulerClosedError("scheduler is not running")
+        self._check_room()
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout_s if timeout_s is None else timeout_s
+        deadline = loop.time() + timeout if timeout is not None else None
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        finally:
+            self._waiting -= 1
+        pending = loop.run_in_executor(self._executor, fn, *args)
+        # The slot is held until the call finishes, even if the caller stops waiting
+        pending.add_done_callback(lambda _: self._slots.release())
+        remaining = max(deadline - loop.time(), 0) if deadline is not None else None
+        return await asyncio.wait_for(asyncio.shield(pending), remaining)
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._next is None:
+                self._next = await self._queue.get()
+            await self._slots.acquire()
+            first, self._next = self._next, None
+            jobs = [first]
+            size = len(first.texts)
+            deadline = loop.time() + self.batch_window
+            while size < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if size + len(job.texts) > self.max_batch:
+                    self._next = job
+                    break
+                jobs.append(job)
+                size += len(job.texts)
+            task = asyncio.create_task(self._run(jobs))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, jobs: List[_Job]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            for autocorrect, timings in sorted({(job.autocorrect, job.timings) for job in jobs}):
+                group = [
+                    job
+                    for job in jobs
+                    if job.autocorrect == autocorrect and job.timings == timings and not job.future.done()
+                ]
+                if not group:
+                    continue
+                texts = [text for job in group for text in job.texts]
+                try:
+                    results = await loop.run_in_executor(self._executor, self._score, texts, autocorrect, timings)
+                except Exception as exc:
+                    for job in group:
+                        if not job.future.done():
+                            job.future.set_exception(exc)
+                    continue
+                offset = 0
+                for job in group:
+                    chunk = results[offset : offset + len(job.texts)]
+                    offset += len(job.texts)
+                    if not job.future.done():
+                        job.future.set_result(chunk)
+        finally:
+            self._slots.release()
+            for _ in jobs:
+                self._queue.task_done()
+
+    def _score(self, texts: List[str], autocorrect: bool, timings: bool) -> List[dict]:
+        return self.model.score_batch(texts, autocorrect=autocorrect, timings=timings)
@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+import os
+from typing import Optional
+
+from pydantic import BaseModel, Field
 
 class Correction(BaseModel):
     original: str
@@ -9,6 +12,7 @@ class Correction(BaseModel):
 class SentenceRequest(BaseModel):
     text: str
     autocorrect: bool = True
+    timings: bool = False
 
 
 class ScoreResponse(BaseModel):
@@ -18,3 +22,64 @@ class ScoreResponse(BaseModel):
     pdg_score: float
     lm_score: float
     combined_score: float
+    # Full pipeline passes avoided by correcting on tokens and parsing only the scored text
+    parses_saved: int = 0
+    # Tokens accepted without candidate generation (confidence-gated fast path)
+    fast_path_tokens: int = 0
+    # Per-stage milliseconds, only when the request asked for timings
+    timings: Optional[dict[str, float]] = None
+    # Model generation, artifact hash and last online update (+u<seq>) that produced this result
+    model_version: Optional[str] = None
+
+
+class CorrectRequest(BaseModel):
+    text: str
+    # Number of alternatives wanted; the server caps it (STDTEXT_MAX_NBEST)
+    k: int = Field(5, ge=1)
+
+
+class CorrectionCandidate(BaseModel):
+    corrected_sentence: str
+    corrections: list[Correction]
+    pdg_score: float
+    lm_score: float
+    combined_score: float
+
+
+class CorrectResponse(BaseModel):
+    sentence: str
+    # Best LM score first
+    candidates: list[CorrectionCandidate]
+    model_version: Optional[str] = None
+
+
+class AcceptRequest(BaseModel):
+    # A sentence the user accepted as correct, e.g. a chosen /correct candidate
+    text: str
+
+
+class AcceptResponse(BaseModel):
+    # Corpus segments kept after cleaning; short fragments teach nothing
+    segments: int
+    new_words: int
+    pdg_rows_updated: int
+    # Updates in the log that are not yet folded into the artifacts
+    pending_updates: int
+    # Updates folded into grammar_stats.json and the corpus by this request
+    compacted: int = 0
+    model_version: Optional[str] = None
+
+
+# Texts per /score/batch request; larger requests are rejected with 422
+MAX_BATCH_TEXTS = int(os.environ.get("STDTEXT_MAX_BATCH_TEXTS", "256"))
+
+
+class BatchSentenceRequest(BaseModel):
+    texts: list[str] = Field(..., max_length=MAX_BATCH_TEXTS)
+    autocorrect: bool = True
+    timings: bool = False
+
+
+class BatchScoreItem(BaseModel):
+    result: Optional[ScoreResponse] = None
+    error: Optional[str] = None
@@ -0,0 +1,265 @@
+"""
+Reproducible speed and quality benchmarks for scoring, correction and PDG training.
+
+Usage:
+    python -m src.benchmarks.run_benchmarks --sample 500 --output bench.json
+    python -m src.benchmarks.run_benchmarks --sample 500 --baseline bench.json
+
+Sentences are sampled from the LM corpus with a fixed seed and corrupted with injected typos,
+abbreviations ("afbryder" -> "afb.") and dropped plurals ("lamper" -> "lampe"). Every run reports
+throughput and p50/p95/p99 latency next to correction accuracy, so a speed-up that costs
+quality shows up in the same JSON report. Result caches are disabled while measuring.
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Ensure project root on sys.path so `python src/benchmarks/run_benchmarks.py` works
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# Full form -> abbreviation commonly written in work orders
+ABBREVIATIONS = {
+    "afbryder": "afb.",
+    "stykker": "stk",
+    "vedrørende": "vedr",
+    "ifølge": "iflg",
+    "eventuelt": "evt",
+    "rekvisition": "rekv",
+}
+LETTERS = "abcdefghijklmnopqrstuvwxyzæøå"
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word))
+    op = rng.choice(("delete", "double", "swap", "sub"))
+    if op == "delete" and len(word) > 3:
+        return word[:i] + word[i + 1 :]
+    if op == "double":
+        return word[:i] + word[i] + word[i:]
+    if op == "swap" and i < len(word) - 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+    return word[:i] + rng.choice(LETTERS) + word[i + 1 :]
+
+
+def corrupt_sentence(sentence: str, rng: random.Random, rate: float = 0.15) -> Tuple[str, int]:
+    """Return the corrupted sentence and the number of tokens that were changed."""
+    tokens = sentence.split()
+    changed = 0
+    for i, token in enumerate(tokens):
+        if token in ABBREVIATIONS and rng.random() < 0.5:
+            tokens[i] = ABBREVIATIONS[token]
+        elif token.endswith("er") and len(token) > 4 and i > 0 and tokens[i - 1].isdigit() and rng.random() < 0.5:
+            tokens[i] = token[:-1]  # "2 lamper" -> "2 lampe"
+        elif token.isalpha() and len(token) > 3 and rng.random() < rate:
+            tokens[i] = _typo(token, rng)
+        if tokens[i] != token:
+            changed += 1
+    return " ".join(tokens), changed
+
+
+def load_sample(corpus: Path, sample: int, seed: int) -> List[str]:
+    with corpus.open("r", encoding="utf-8") as f:
+        lines = [" ".join(line.split()) for line in f if line.strip()]
+    rng = random.Random(seed)
+    return rng.sample(lines, min(sample, len(lines)))
+
+
+def latency_summary(latencies: Sequence[float], wall: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "items": len(ordered),
+        "items_per_s": len(ordered) / wall if wall else 0.0,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+    }
+
+
+def timed(fn: Callable, items: Sequence) -> Tuple[List, Dict[str, float]]:
+    outputs, latencies = [], []
+    began = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        outputs.append(fn(item))
+        latencies.append(time.perf_counter() - start)
+    return outputs, latency_summary(latencies, time.perf_counter() - began)
+
+
+def correction_accuracy(clean: Sequence[str], corrupted: Sequence[str], corrected: Sequence[str]) -> Dict[str, float]:
+    """Token-level restore rate on corrupted tokens and damage rate on tokens that were fine."""
+    fixed = broken = untouched = damaged = exact = 0
+    for gold, noisy, out in zip(clean, corrupted, corrected):
+        gold_t, noisy_t, out_t = gold.split(), noisy.split(), out.split()
+        exact += out.strip() == gold.strip()
+        if len(gold_t) != len(out_t):
+            # Reordering heuristics changed the length; count every corrupted token as missed
+            broken += sum(g != n for g, n in zip(gold_t, noisy_t))
+            continue
+        for g, n, o in zip(gold_t, noisy_t, out_t):
+            if g != n:
+                broken += 1
+                fixed += o == g
+            else:
+                untouched += 1
+                damaged += o != g
+    return {
+        "sentence_exact": exact / max(len(clean), 1),
+        "token_restore_rate": fixed / max(broken, 1),
+        "token_damage_rate": damaged / max(untouched, 1),
+    }
+
+
+def bench_score(model, clean: List[str], corrupted: List[str]) -> Dict[str, object]:
+    report = {}
+    for autocorrect in (False, True):
+        outputs, stats = timed(lambda s: model.score(s, autocorrect=autocorrect), corrupted)
+        entry = dict(stats)
+        if autocorrect:
+            tokens = sum(len(s.split()) for s in corrupted)
+            entry["fast_path_share"] = sum(o["fast_path_tokens"] for o in outputs) / max(tokens, 1)
+            entry["accuracy"] = correction_accuracy(clean, corrupted, [o["corrected_sentence"] for o in outputs])
+            clean_out, _ = timed(lambda s: model.score(s, autocorrect=True), clean)
+            entry["clean_sentences_changed"] = sum(
+                o["corrected_sentence"] != s for o, s in zip(clean_out, clean)
+            ) / max(len(clean), 1)
+        report["autocorrect" if autocorrect else "no_autocorrect"] = entry
+    return report
+
+
+def bench_suggest(spellchecker, corrupted: List[str]) -> Dict[str, object]:
+    tokens = [tok for sentence in corrupted for tok in sentence.split() if tok.isalpha()]
+    # Bypass the suggestion cache so repeated tokens are measured too
+    _, stats = timed(lambda tok: spellchecker._suggest(tok, False), tokens)
+    oov = sum(1 for tok in tokens if tok.lower() not in spellchecker.vocab)
+    stats["oov_tokens"] = oov
+    return stats
+
+
+def bench_train(corpus_lines: List[str], processes: int) -> Dict[str, object]:
+    from src.training.train_pdg import train_pdg
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpus.txt"
+        path.write_text("\n".join(corpus_lines) + "\n", encoding="utf-8")
+        began = time.perf_counter()
+        train_pdg(str(path), n_process=processes)
+        wall = time.perf_counter() - began
+    return {"sentences": len(corpus_lines), "processes": processes, "seconds": wall, "sentences_per_s": len(corpus_lines) / wall}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], prefix: str = "") -> List[str]:
+    """Flatten both reports and list numeric changes as 'path: old -> new (ratio)'."""
+    lines = []
+    for key, value in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and isinstance(old, dict):
+            lines.extend(compare(value, old, path + "."))
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and not isinstance(value, bool):
+            ratio = f" ({value / old:.2f}x)" if old else ""
+            lines.append(f"{path}: {old:.4g} -> {value:.4g}{ratio}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scoring, correction and PDG training")
+    parser.add_argument("--corpus", default="data/lm/lm_corpus.txt")
+    parser.add_argument("--pdg", default="data/pdg/grammar_stats.json")
+    parser.add_argument("--lm", default="data/lm/my_corpus.bin")
+    parser.add_argument("--lemmas", default="data/lm/lemmas.json")
+    parser.add_argument("--sample", type=int, default=300, help="Sentences per benchmark")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--only", default="score,suggest,train", help="Comma-separated subset to run")
+    parser.add_argument("--train-processes", type=int, default=1)
+    parser.add_argument("--no-fast-path", action="store_true", help="Generate candidates for every token")
+    parser.add_argument("--output", default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    from src.models.hybrid_model import HybridModel
+    from src.nlp.spacy_pipeline import pipeline_stats
+
+    only = set(args.only.split(","))
+    clean = load_sample(Path(args.corpus), args.sample, args.seed)
+    rng = random.Random(args.seed)
+    corrupted = [corrupt_sentence(s, rng)[0] for s in clean]
+
+    report: Dict[str, object] = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "sample": len(clean),
+            "seed": args.seed,
+            "fast_path": not args.no_fast_path,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+    }
+
+    if only & {"score", "suggest"}:
+        load_start = time.perf_counter()
+        model = HybridModel(
+            pdg_path=args.pdg,
+            lm_path=args.lm,
+            vocab_path=args.corpus,
+            lemma_path=args.lemmas,
+            correction_cutoff=0.82,
+            cache_size=0,
+            fast_path=not args.no_fast_path,
+        )
+        model.score(clean[0])  # pay the lazy pipeline load outside the measurements
+        report["meta"]["model_load_s"] = time.perf_counter() - load_start
+        if model.spellchecker:
+            # Built on the first fuzzy lookup, which the warm-up sentence may never need
+            index_start = time.perf_counter()
+            model.spellchecker.vocab_index
+            report["meta"]["vocab_index_s"] = time.perf_counter() - index_start
+            model.spellchecker.suggest_cache.max_items = 0
+        if "score" in only:
+            report["score"] = bench_score(model, clean, corrupted)
+        if "suggest" in only and model.spellchecker:
+            report["suggest"] = bench_suggest(model.spellchecker, corrupted)
+        report["meta"]["pipeline"] = pipeline_stats()
+
+    if "train" in only:
+        report["train_pdg"] = bench_train(clean, args.train_processes)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        for line in compare({k: v for k, v in report.items() if k != "meta"}, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
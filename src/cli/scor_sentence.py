@@ -1,7 +1,8 @@
 import json
 import math
 import spacy
-import kenlm
+
+from src.models.lm_registry import get_model
 
 # Load spaCy model
 nlp = spacy.load("da_core_news_sm")
@@ -13,7 +14,7 @@ with open("grammar_stats.json", "r", encoding="utf-8") as f:
 PDG_PROBS = PDG["probs"]  # nested dict: head_pos -> dep -> child_pos -> prob
 
 # Load KenLM LM
-LM = kenlm.Model("my_corpus.bin")  # path to your LM
+LM = get_model("my_corpus.bin")  # path to your LM; shared with any other consumer
 
 def pdg_score(sentence: str) -> float:
     """
@@ -0,0 +1,238 @@
+"""
+Score and correct large inputs line by line with the HybridModel.
+
+Usage:
+    python -m src.cli.score_corpus work_orders.txt --output scored.jsonl
+    python -m src.cli.score_corpus orders.jsonl --text-field description --processes 4 --output scored.jsonl
+    cat orders.tsv | python -m src.cli.score_corpus - --format tsv --text-column 2 > scored.jsonl
+
+Input is read as a stream (plain text, JSONL or TSV; picked by file extension unless --format
+is given) and scored in batches of --batch-size through HybridModel.score_batch, which parses
+with nlp.pipe. Each input record produces one JSON line, written in input order and flushed
+per batch. At most `2 * processes` batches are in flight, so memory does not grow with the
+input. When --output already holds results, the run resumes after the last complete line.
+A line that cannot be read (invalid JSON, a non-object, a non-string text field) produces a
+{"source", "line", "error"} result like a line that fails to score; the run continues.
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+# Ensure project root on sys.path so `python src/cli/score_corpus.py` works
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".tsv": "tsv"}
+
+# (source, line number, text, error) for one input record; error is set when the line is malformed
+Record = Tuple[str, int, str, Optional[str]]
+
+_worker_model = None
+
+
+def _open_input(path: str) -> TextIO:
+    if path == "-":
+        return sys.stdin
+    return open(path, "r", encoding="utf-8-sig")
+
+
+def _line_text(line: str, kind: str, text_field: str, text_column: int) -> str:
+    """The text of one input line; ValueError when a JSONL line does not hold a usable record."""
+    if kind == "jsonl":
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"invalid JSON: {exc}") from None
+        if not isinstance(value, dict):
+            raise ValueError(f"expected a JSON object, got {type(value).__name__}")
+        text = value.get(text_field) or ""
+        if not isinstance(text, str):
+            raise ValueError(f"field {text_field!r} is {type(text).__name__}, not a string")
+        return text
+    if kind == "tsv":
+        columns = line.split("\t")
+        return columns[text_column] if text_column < len(columns) else ""
+    return line
+
+
+def read_records(paths: List[str], fmt: Optional[str], text_field: str, text_column: int) -> Iterator[Record]:
+    """Yield one record per non-empty input line across all inputs, in order."""
+    for path in paths:
+        kind = fmt or FORMATS.get(Path(path).suffix.lower(), "text")
+        source = "<stdin>" if path == "-" else path
+        f = _open_input(path)
+        try:
+            for lineno, line in enumerate(f, 1):
+                line = line.rstrip("\n")
+                if not line.strip():
+                    continue
+                try:
+                    yield source, lineno, _line_text(line, kind, text_field, text_column).strip(), None
+                except ValueError as exc:
+                    yield source, lineno, "", str(exc)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def batched(records: Iterator[Record], size: int) -> Iterator[List[Record]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker(model_kwargs: Dict[str, object]):
+    global _worker_model
+    from src.models.hybrid_model import HybridModel
+
+    _worker_model = HybridModel(**model_kwargs)
+
+
+def _score_batch(task: Tuple[List[Record], bool]) -> List[dict]:
+    batch, autocorrect = task
+    readable = [text for _, _, text, error in batch if error is None]
+    results = iter(_worker_model.score_batch(readable, autocorrect=autocorrect) if readable else [])
+    out = []
+    for source, lineno, _, error in batch:
+        result = {"error": error} if error is not None else next(results)
+        out.append({"source": source, "line": lineno, **result})
+    return out
+
+
+def _scored_batches(batches: Iterator[List[Record]], autocorrect: bool, processes: int, model_kwargs) -> Iterator[List[dict]]:
+    """Score batches in order; with several processes keep a bounded window of batches in flight."""
+    if processes <= 1:
+        _init_worker(model_kwargs)
+        for batch in batches:
+            yield _score_batch((batch, autocorrect))
+        return
+    with Pool(processes=processes, initializer=_init_worker, initargs=(model_kwargs,)) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(_score_batch, ((batch, autocorrect),)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def completed_lines(path: Path) -> int:
+    """Count complete result lines and cut off a partially written last line."""
+    if not path.exists():
+        return 0
+    done = 0
+    good_end = 0
+    with path.open("rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            done += 1
+            good_end += len(line)
+    with path.open("r+b") as f:
+        f.truncate(good_end)
+    return done
+
+
+def _skip(records: Iterator[Record], n: int) -> Iterator[Record]:
+    for i, record in enumerate(records):
+        if i >= n:
+            yield record
+
+
+class Progress:
+    def __init__(self, every_s: float = 2.0, stream: TextIO = sys.stderr, enabled: bool = True):
+        self.every_s = every_s
+        self.stream = stream
+        self.enabled = enabled
+        self.began = self.last = time.perf_counter()
+        self.records = 0
+        self.errors = 0
+
+    def update(self, results: List[dict]) -> None:
+        self.records += len(results)
+        self.errors += sum(1 for r in results if "error" in r)
+        now = time.perf_counter()
+        if self.enabled and now - self.last >= self.every_s:
+            self.last = now
+            self.report(end="\r")
+
+    def report(self, end: str = "\n") -> None:
+        if not self.enabled:
+            return
+        elapsed = max(time.perf_counter() - self.began, 1e-9)
+        self.stream.write(
+            f"{self.records} lines, {self.records / elapsed:.1f} lines/s, {self.errors} errors, {elapsed:.0f}s{end}"
+        )
+        self.stream.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score and correct text lines from files or stdin")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="Input files; '-' reads stdin")
+    parser.add_argument("--output", default=None, help="JSONL output file (default: stdout); resumed if it exists")
+    parser.add_argument("--format", choices=["text", "jsonl", "tsv"], default=None, help="Input format")
+    parser.add_argument("--text-field", default="text", help="JSONL field holding the text")
+    parser.add_argument("--text-column", type=int, default=0, help="TSV column holding the text")
+    parser.add_argument("--pdg", default="data/pdg/grammar_stats.json")
+    parser.add_argument("--lm", default="data/lm/my_corpus.bin")
+    parser.add_argument("--vocab", default="data/lm/lm_corpus.txt", help="Spellchecker corpus")
+    parser.add_argument("--lemmas", default="data/lm/lemmas.json")
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--cutoff", type=float, default=0.82, help="Spellchecker correction cutoff")
+    parser.add_argument("--backbone", default=None, help="spaCy/DaCy backbone (see src.nlp.spacy_pipeline)")
+    parser.add_argument("--no-autocorrect", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=64, help="Lines per score_batch call")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes, each with its own model")
+    parser.add_argument("--quiet", action="store_true", help="No progress on stderr")
+    args = parser.parse_args()
+
+    model_kwargs = {
+        "pdg_path": args.pdg,
+        "lm_path": args.lm,
+        "alpha": args.alpha,
+        "vocab_path": args.vocab if not args.no_autocorrect else None,
+        "correction_cutoff": args.cutoff,
+        "lemma_path": args.lemmas,
+        "batch_size": args.batch_size,
+        "nlp_backbone": args.backbone,
+    }
+
+    records = read_records(args.inputs, args.format, args.text_field, args.text_column)
+    if args.output:
+        output = Path(args.output)
+        done = completed_lines(output)
+        if done:
+            print(f"Resuming after {done} scored lines", file=sys.stderr)
+            records = _skip(records, done)
+        out = output.open("a", encoding="utf-8")
+    else:
+        out = sys.stdout
+
+    progress = Progress(enabled=not args.quiet)
+    try:
+        batches = batched(records, args.batch_size)
+        for results in _scored_batches(batches, not args.no_autocorrect, args.processes, model_kwargs):
+            for result in results:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            progress.update(results)
+    finally:
+        progress.report()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Bounded LRU caches for scoring results and token suggestions.
+
+Work-order traffic repeats the same phrases constantly, so whole-sentence results and per-token
+suggestions are cached. Each cache is bounded by entry count and by an approximate memory
+budget; least recently used entries are evicted first.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional
+
+_MISSING = object()
+
+
+def approx_size(value) -> int:
+    """Rough deep size in bytes for the plain containers we cache (dicts, lists, strings, numbers)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approx_size(v) for v in value)
+    return size
+
+
+class LRUCache:
+    def __init__(self, max_items: int = 4096, max_bytes: Optional[int] = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value) -> None:
+        if self.max_items <= 0:
+            return
+        size = approx_size(key) + approx_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.max_items or (self.max_bytes and self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ArtifactVersion:
+    """
+    Version string derived from the size and mtime of artifact files.
+
+    Files are re-stat'ed at most every `check_interval` seconds so the check stays off the hot path.
+    """
+
+    def __init__(self, paths: Iterable[Optional[str]], check_interval: float = 2.0):
+        self.paths = [p for p in paths if p]
+        self.check_interval = check_interval
+        self._checked_at = 0.0
+        self._version = ""
+
+    def _compute(self) -> str:
+        parts = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                parts.append(f"{st.st_size}:{st.st_mtime_ns}")
+            except OSError:
+                parts.append("-")
+        return "|".join(parts)
+
+    def current(self) -> str:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._version = self._compute()
+            self._checked_at = now
+        return self._version
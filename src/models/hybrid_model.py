@@ -1,6 +1,13 @@
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+from src.models.cache import ArtifactVersion, LRUCache
 from src.models.pdg_model import PDGModel
 from src.models.lm_model import LMModel
+from src.models.lm_registry import DEFAULT_LOAD_METHOD
+from src.models.metrics import collect_timings, metrics
 from src.models.spellchecker import SpellChecker
+from src.nlp.spacy_pipeline import configure, parse, parse_cache_stats, parse_many
 
 
 class HybridModel:
@@ -12,34 +19,217 @@ class HybridModel:
         vocab_path=None,
         correction_cutoff: float = 0.8,
         lemma_path: str | None = None,
+        batch_size: int = 32,
+        lm_load_method: str = DEFAULT_LOAD_METHOD,
+        nlp_backbone: str | None = None,
+        cache_size: int = 4096,
+        cache_max_bytes: int | None = 64 * 1024 * 1024,
+        fast_path: bool = True,
+        nbest_beam_size: int = 16,
+        max_nbest: int = 10,
     ):
+        if nlp_backbone:
+            configure(backbone=nlp_backbone)
+        # Fingerprint the files before reading them, so the version never claims newer data than
+        # what is loaded. Artifacts changed later are picked up by building a new model
+        # (ModelHandle.reload), never in place.
+        self.artifacts = ArtifactVersion([pdg_path, lm_path, vocab_path, lemma_path])
+        self.artifact_version = self.artifacts.current()
         self.pdg = PDGModel(pdg_path)
-        self.lm = LMModel(lm_path)
+        # LMModel and SpellChecker get the same KenLM instance from the registry
+        self.lm = LMModel(lm_path, load_method=lm_load_method)
         self.alpha = alpha
+        self.batch_size = batch_size
         self.spellchecker = (
-            SpellChecker(vocab_path, cutoff=correction_cutoff, lm_path=lm_path, lemma_path=lemma_path)
+            SpellChecker(
+                vocab_path,
+                cutoff=correction_cutoff,
+                lm_path=lm_path,
+                lemma_path=lemma_path,
+                lm_load_method=lm_load_method,
+                fast_path=fast_path,
+                nbest_beam_size=nbest_beam_size,
+                max_nbest=max_nbest,
+            )
             if vocab_path
             else None
         )
+        # Whole-sentence results keyed by (text, autocorrect, alpha); cleared on online updates
+        self.result_cache = LRUCache(max_items=cache_size, max_bytes=cache_max_bytes)
 
-    def score(self, sentence: str, autocorrect: bool = True) -> dict:
-        corrections = {"corrected_sentence": sentence, "corrections": []}
-        text_for_scoring = sentence
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {"results": self.result_cache.stats()}
+        if self.spellchecker:
+            stats["suggestions"] = self.spellchecker.suggest_cache.stats()
+        parses = parse_cache_stats()
+        if parses is not None:
+            stats["parses"] = parses
+        return stats
 
+    def _correct(self, sentence: str, autocorrect: bool) -> Tuple[Dict[str, object], int]:
+        """
+        Return corrections plus the number of parses the unshared pipeline would have run
+        (one for the spellchecker, one for scoring). Correction only needs the tokenizer.
+        """
         if autocorrect and self.spellchecker:
-            corrections = self.spellchecker.correct(sentence)
-            text_for_scoring = corrections["corrected_sentence"]
-
-        pdg_s = self.pdg.score(text_for_scoring)
-        lm_s = self.lm.score(text_for_scoring)
-
-        combined = self.alpha * pdg_s + (1 - self.alpha) * lm_s
+            return self.spellchecker.correct(sentence), 2
+        return {"corrected_sentence": sentence, "corrections": []}, 1
 
+    def _result(self, sentence: str, corrections: Dict[str, object], pdg_s: float, lm_s: float, parses_saved: int) -> dict:
         return {
             "sentence": sentence,
             "corrected_sentence": corrections["corrected_sentence"],
             "corrections": corrections["corrections"],
             "pdg_score": pdg_s,
             "lm_score": lm_s,
-            "combined_score": combined,
+            "combined_score": self.alpha * pdg_s + (1 - self.alpha) * lm_s,
+            "parses_saved": parses_saved,
+            "fast_path_tokens": corrections.get("fast_path_tokens", 0),
         }
+
+    def score(self, sentence: str, autocorrect: bool = True, timings: bool = False) -> dict:
+        """
+        Score one sentence. With `timings` the result carries per-stage milliseconds
+        (empty when it was served from the cache).
+        """
+        key = (sentence, autocorrect, self.alpha)
+        result = self.result_cache.get(key)
+        stage_ms: Dict[str, float] = {}
+        if result is None:
+            with collect_timings() if timings else nullcontext(stage_ms) as stage_ms:
+                with metrics.timer("score"):
+                    result = self._score(sentence, autocorrect)
+            metrics.inc("sentences_scored")
+            self.result_cache.put(key, result)
+        result = dict(result)
+        if timings:
+            result["timings"] = stage_ms
+        return result
+
+    def _score(self, sentence: str, autocorrect: bool) -> dict:
+        # Correct on tokens alone, then run the full pipeline once, on the text that is scored
+        corrections, naive_parses = self._correct(sentence, autocorrect)
+        text_for_scoring = corrections["corrected_sentence"]
+        doc = parse(text_for_scoring)
+
+        pdg_s = self.pdg.score_doc(doc)
+        lm_s = self.lm.score(text_for_scoring)
+        return self._result(sentence, corrections, pdg_s, lm_s, naive_parses - 1)
+
+    def correct_nbest(self, sentence: str, k: int = 5) -> dict:
+        """
+        The top-k corrections of one sentence with LM, PDG and combined scores, in LM order.
+        LM scores come from the lattice search; the candidates are parsed in one batch for PDG.
+        """
+        key = ("nbest", sentence, k, self.alpha)
+        result = self.result_cache.get(key)
+        if result is None:
+            with metrics.timer("correct_nbest"):
+                result = self._correct_nbest(sentence, k)
+            self.result_cache.put(key, result)
+        return dict(result)
+
+    def _correct_nbest(self, sentence: str, k: int) -> dict:
+        if self.spellchecker:
+            candidates = self.spellchecker.correct_nbest(sentence, k=k)
+        else:
+            candidates = [{"corrected_sentence": sentence, "corrections": [], "lm_score": None}]
+
+        # Only the candidates are parsed; the lattice was built from tokens
+        docs = list(parse_many([c["corrected_sentence"] for c in candidates], batch_size=self.batch_size))
+        pdg_scores = self.pdg.score_docs(docs)
+
+        scored = []
+        for candidate, pdg_s in zip(candidates, pdg_scores):
+            lm_s = candidate["lm_score"]
+            if lm_s is None:
+                lm_s = self.lm.score(candidate["corrected_sentence"])
+            scored.append(
+                {
+                    "corrected_sentence": candidate["corrected_sentence"],
+                    "corrections": candidate["corrections"],
+                    "pdg_score": pdg_s,
+                    "lm_score": lm_s,
+                    "combined_score": self.alpha * pdg_s + (1 - self.alpha) * lm_s,
+                }
+            )
+        return {"sentence": sentence, "candidates": scored}
+
+    def _parse_all(self, texts: List[str], batch_size: int) -> list:
+        """Parse texts in batches; items that fail to parse come back as the raised exception."""
+        try:
+            return list(parse_many(texts, batch_size=batch_size))
+        except Exception:
+            # One bad item aborts nlp.pipe; retry one by one so only that item fails
+            docs = []
+            for text in texts:
+                try:
+                    docs.append(parse(text))
+                except Exception as exc:
+                    docs.append(exc)
+            return docs
+
+    def score_batch(
+        self,
+        sentences: List[str],
+        autocorrect: bool = True,
+        batch_size: Optional[int] = None,
+        timings: bool = False,
+    ) -> List[dict]:
+        """
+        Score many sentences with batched parsing. Results keep the input order; an item that
+        fails carries an "error" message instead of scores and does not fail the batch.
+        With `timings`, computed items carry the per-stage milliseconds of the whole batch.
+        """
+        keys = [(sentence, autocorrect, self.alpha) for sentence in sentences]
+        results = [self.result_cache.get(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        stage_ms: Dict[str, float] = {}
+        if misses:
+            with collect_timings() if timings else nullcontext(stage_ms) as stage_ms:
+                with metrics.timer("score_batch"):
+                    computed = self._score_batch([sentences[i] for i in misses], autocorrect, batch_size or self.batch_size)
+            metrics.inc("sentences_scored", len(misses))
+            for i, result in zip(misses, computed):
+                if "error" not in result:
+                    self.result_cache.put(keys[i], result)
+                results[i] = result
+
+        missed = set(misses)
+        out = []
+        for i, result in enumerate(results):
+            result = dict(result)
+            if timings and "error" not in result:
+                result["timings"] = stage_ms if i in missed else {}
+            out.append(result)
+        return out
+
+    def _score_batch(self, sentences: List[str], autocorrect: bool, batch_size: int) -> List[dict]:
+        results: List[Optional[dict]] = [None] * len(sentences)
+
+        corrected: Dict[int, Tuple[Dict[str, object], int]] = {}
+        for i, sentence in enumerate(sentences):
+            try:
+                corrected[i] = self._correct(sentence, autocorrect)
+            except Exception as exc:
+                results[i] = {"sentence": sentence, "error": str(exc)}
+
+        # One batched pipeline pass over the texts that are actually scored
+        pending = list(corrected)
+        docs = self._parse_all([corrected[i][0]["corrected_sentence"] for i in pending], batch_size)
+        order = []
+        parsed = []
+        for i, doc in zip(pending, docs):
+            if isinstance(doc, Exception):
+                results[i] = {"sentence": sentences[i], "error": str(doc)}
+            else:
+                order.append(i)
+                parsed.append(doc)
+
+        texts = [corrected[i][0]["corrected_sentence"] for i in order]
+        pdg_scores = self.pdg.score_docs(parsed)
+        lm_scores = self.lm.score_many(texts)
+        for i, pdg_s, lm_s in zip(order, pdg_scores, lm_scores):
+            corrections, naive_parses = corrected[i]
+            results[i] = self._result(sentences[i], corrections, pdg_s, lm_s, naive_parses - 1)
+        return results
@@ -0,0 +1,136 @@
+"""
+Per-category fuzzy index over lemma canonicals and their variants.
+
+Replaces the difflib scan in SpellChecker._nearest_lemma, which flattened the canonicals of
+every requested category into a new list on each call. Forms are indexed by padded character
+bigrams; a lookup only scores the forms that share a bigram with the query, using difflib's
+ratio so cutoffs keep their meaning. A match on a variant counts for its canonical. Lemmas can
+be added to a built index in place.
+
+Parity check against the difflib scan over canonicals:
+    python -m src.models.lemma_index --lemmas data/lm/lemmas.json --sample 2000
+"""
+
+import argparse
+import difflib
+import random
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+
+class LemmaMatch(NamedTuple):
+    canonical: str
+    score: float
+    category: str
+
+
+def _bigrams(form: str) -> Set[str]:
+    # Bigrams rather than trigrams: short words at the cutoff often share no three-letter run
+    padded = f" {form} "
+    return {padded[i : i + 2] for i in range(len(padded) - 1)}
+
+
+class LemmaIndex:
+    def __init__(self, lemmas: Optional[Mapping[str, Mapping[str, Iterable[str]]]] = None):
+        # category -> form -> canonicals it belongs to
+        self.forms: Dict[str, Dict[str, Set[str]]] = {}
+        # category -> bigram -> forms containing it
+        self.grams: Dict[str, Dict[str, Set[str]]] = {}
+        for category, items in (lemmas or {}).items():
+            for canonical, variants in items.items():
+                self.add(category, canonical, variants)
+
+    def add(self, category: str, canonical: str, variants: Iterable[str] = ()) -> None:
+        """Index `canonical` and its variants under `category`; known forms are only linked."""
+        forms = self.forms.setdefault(category, {})
+        grams = self.grams.setdefault(category, {})
+        for form in (canonical, *variants):
+            owners = forms.get(form)
+            if owners is None:
+                owners = forms[form] = set()
+                for gram in _bigrams(form):
+                    grams.setdefault(gram, set()).add(form)
+            owners.add(canonical)
+
+    def lookup(
+        self, token: str, categories: Optional[Iterable[str]] = None, cutoff: float = 0.75, n: int = 1
+    ) -> List[LemmaMatch]:
+        """
+        Canonicals whose best form has a difflib ratio >= cutoff with `token`, best first.
+        Ties are broken like difflib.get_close_matches (the larger string wins).
+        """
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(token)
+        query = _bigrams(token)
+        # real_quick_ratio only depends on the lengths; apply it before touching the matcher
+        min_len = len(token) * cutoff / (2 - cutoff) - 1e-9
+        max_len = len(token) * (2 - cutoff) / cutoff + 1e-9 if cutoff > 0 else float("inf")
+        best: Dict[Tuple[str, str], float] = {}
+        for category in categories if categories is not None else list(self.forms):
+            grams = self.grams.get(category)
+            if not grams:
+                continue
+            shared: Set[str] = set()
+            for gram in query:
+                shared.update(grams.get(gram, ()))
+            for form in shared:
+                if not min_len <= len(form) <= max_len:
+                    continue
+                matcher.set_seq1(form)
+                if matcher.quick_ratio() < cutoff:
+                    continue
+                score = matcher.ratio()
+                if score < cutoff:
+                    continue
+                for canonical in self.forms[category][form]:
+                    key = (canonical, category)
+                    if score > best.get(key, -1.0):
+                        best[key] = score
+        ranked = sorted(best.items(), key=lambda item: (item[1], item[0][0]), reverse=True)
+        return [LemmaMatch(canonical, score, category) for (canonical, category), score in ranked[:n]]
+
+
+def _corrupt(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word))
+    if rng.random() < 0.5 and len(word) > 1:
+        return word[:i] + word[i + 1 :]
+    return word[:i] + rng.choice("abcdefghijklmnopqrstuvwxyzæøå") + word[i + 1 :]
+
+
+def parity_report(lemmas: Mapping[str, Mapping[str, Iterable[str]]], queries: Iterable[str], cutoff: float = 0.75) -> Dict[str, object]:
+    """
+    Compare against difflib over canonicals. The index also matches variants, so a query may
+    find a canonical through a variant that difflib missed; that is counted, not a mismatch.
+    """
+    canonicals_only = LemmaIndex({cat: {c: () for c in items} for cat, items in lemmas.items()})
+    flat = [c for items in lemmas.values() for c in items]
+    total = same = 0
+    for query in queries:
+        expected = difflib.get_close_matches(query, flat, n=1, cutoff=cutoff)
+        got = [m.canonical for m in canonicals_only.lookup(query, cutoff=cutoff, n=1)]
+        total += 1
+        same += expected == got
+    full = LemmaIndex(lemmas)
+    via_variants = sum(
+        1 for query in queries if full.lookup(query, cutoff=cutoff) and not difflib.get_close_matches(query, flat, n=1, cutoff=cutoff)
+    )
+    return {"queries": total, "same": same / max(total, 1), "found_only_via_variants": via_variants}
+
+
+def main():
+    from src.models.lexicon import read_lemmas
+
+    parser = argparse.ArgumentParser(description="Check LemmaIndex matches against difflib")
+    parser.add_argument("--lemmas", default="data/lm/lemmas.json")
+    parser.add_argument("--sample", type=int, default=2000, help="Number of corrupted lemmas to test")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    lemmas = read_lemmas(args.lemmas)
+    rng = random.Random(args.seed)
+    forms = [form for items in lemmas.values() for canonical, variants in items.items() for form in (canonical, *variants)]
+    queries = [_corrupt(rng.choice(forms), rng) for _ in range(args.sample)] if forms else []
+    print(parity_report(lemmas, queries))
+
+
+if __name__ == "__main__":
+    main()
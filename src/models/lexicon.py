@@ -0,0 +1,223 @@
+"""
+Vocabulary and lemma lexicon used by the spellchecker.
+
+The lexicon can be read from the text sources (`lm_corpus.txt`, `lemmas.json`) or from a
+compiled binary artifact built by `src/training/compile_lexicon.py`. The artifact saves
+re-tokenizing the corpus: it is read in one pass into the same dicts the text loader builds.
+
+Artifact layout (little endian):
+    magic b"STDLEX" | uint16 format version | uint32 header length | JSON header | sections
+The header records the section offsets and a fingerprint of the sources it was built from,
+so a stale artifact is ignored instead of silently shadowing a retrained corpus.
+"""
+
+import json
+import struct
+import sys
+from collections import Counter
+from itertools import zip_longest
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MAGIC = b"STDLEX"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<6sHI")
+CATEGORIES = ("actions", "objects", "abbreviations")
+
+
+class Lexicon:
+    def __init__(
+        self,
+        vocab: Counter,
+        lemmas: Dict[str, Dict[str, List[str]]],
+        variant_to_canonical: Optional[Dict[str, str]] = None,
+        canonicals_by_cat: Optional[Dict[str, set]] = None,
+    ):
+        self.vocab = vocab
+        self.lemmas = lemmas
+        self.variant_to_canonical = (
+            variant_to_canonical if variant_to_canonical is not None else build_variant_lookup(lemmas)
+        )
+        self.canonicals_by_cat = (
+            canonicals_by_cat
+            if canonicals_by_cat is not None
+            else {cat: set(items.keys()) for cat, items in lemmas.items()}
+        )
+
+
+def segment_counts_path(corpus_path: Path) -> Path:
+    """Per-segment counts written next to a deduplicated corpus by prepare_lm_courpus_domain."""
+    return corpus_path.with_name(corpus_path.name + ".counts.tsv")
+
+
+def _read_counted_vocab(corpus_path: Path, counts_path: Path) -> Optional[Counter]:
+    """Vocabulary from the segment counts, or None if they do not pair up line by line with the corpus."""
+    vocab: Counter = Counter()
+    with corpus_path.open("r", encoding="utf-8") as corpus, counts_path.open("r", encoding="utf-8") as counts:
+        for corpus_line, counts_line in zip_longest(corpus, counts):
+            if corpus_line is None or counts_line is None:
+                return None
+            segment, _, count = counts_line.rstrip("\n").rpartition("\t")
+            if segment != corpus_line.rstrip() or not count.isdigit():
+                return None
+            for token in segment.split():
+                vocab[token.lower()] += int(count)
+    return vocab
+
+
+def read_vocab(corpus_path: Path) -> Counter:
+    """
+    Token -> corpus frequency; frequencies rank fuzzy suggestions.
+    When the corpus was deduplicated, its segment counts restore the original frequencies.
+    Counts that no longer match the corpus (e.g. left from an earlier run) are ignored.
+    """
+    vocab: Counter = Counter()
+    if not corpus_path.exists():
+        return vocab
+
+    counts_path = segment_counts_path(corpus_path)
+    if counts_path.exists():
+        counted = _read_counted_vocab(corpus_path, counts_path)
+        if counted is not None:
+            return counted
+        print(f"Ignoring {counts_path}: it does not match {corpus_path}", file=sys.stderr)
+
+    with corpus_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            for token in line.strip().split():
+                vocab[token.lower()] += 1
+    return vocab
+
+
+def read_lemmas(lemma_path: Optional[str]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Load lemma variants keyed by category, preserving canonical -> variants mapping.
+    Expected schema:
+    {
+      "actions": { "installation": ["instal", ...], ... },
+      "objects": { "køkken": ["køken"], ... },
+      "abbreviations": { "afbryder": ["afb", "afb."], ... }
+    }
+    """
+    empty = {cat: {} for cat in CATEGORIES}
+    if not lemma_path:
+        return empty
+    path = Path(lemma_path)
+    if not path.exists():
+        return empty
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return empty
+
+    def norm(cat: str) -> Dict[str, List[str]]:
+        raw = data.get(cat, {}) or {}
+        return {k.lower(): [str(v).lower() for v in (vals or [])] for k, vals in raw.items()}
+
+    return {cat: norm(cat) for cat in CATEGORIES}
+
+
+def build_variant_lookup(lemmas: Dict[str, Dict[str, List[str]]]) -> Dict[str, str]:
+    """Flatten variant -> canonical across categories."""
+    lookup: Dict[str, str] = {}
+    for cat_map in lemmas.values():
+        for canonical, variants in cat_map.items():
+            lookup[canonical] = canonical
+            for v in variants:
+                lookup[v] = canonical
+    return lookup
+
+
+def source_fingerprint(corpus_path: Path, lemma_path: Optional[str]) -> Dict[str, object]:
+    """Size and mtime of the text sources; cheap enough to check on every start."""
+
+    def stat(path: Optional[Path]):
+        if path is None or not path.exists():
+            return None
+        st = path.stat()
+        return [st.st_size, st.st_mtime_ns]
+
+    return {
+        "corpus": stat(Path(corpus_path)),
+        "counts": stat(segment_counts_path(Path(corpus_path))),
+        "lemmas": stat(Path(lemma_path) if lemma_path else None),
+    }
+
+
+def load_text_lexicon(corpus_path: Path, lemma_path: Optional[str]) -> Lexicon:
+    return Lexicon(read_vocab(Path(corpus_path)), read_lemmas(lemma_path))
+
+
+def save_lexicon(lexicon: Lexicon, path: Path, fingerprint: Dict[str, object]) -> None:
+    words = sorted(lexicon.vocab)
+    sections = {
+        "words": "\n".join(words).encode("utf-8"),
+        "freqs": struct.pack(f"<{len(words)}I", *(lexicon.vocab[w] for w in words)),
+        "variants": "\n".join(f"{v}\t{c}" for v, c in sorted(lexicon.variant_to_canonical.items())).encode("utf-8"),
+        "lemmas": json.dumps(lexicon.lemmas, ensure_ascii=False).encode("utf-8"),
+    }
+    offsets = {}
+    position = 0
+    for name, blob in sections.items():
+        # 4-byte alignment keeps the uint32 frequency array castable in place
+        position += -position % 4
+        offsets[name] = [position, len(blob)]
+        position += len(blob)
+    header = json.dumps(
+        {"sources": fingerprint, "sections": offsets, "n_words": len(words)}, ensure_ascii=False
+    ).encode("utf-8")
+    header += b" " * (-(len(header) + _PREFIX.size) % 4)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        written = 0
+        for name, blob in sections.items():
+            f.write(b"\0" * (offsets[name][0] - written))
+            f.write(blob)
+            written = offsets[name][0] + len(blob)
+    tmp.replace(path)
+
+
+def load_lexicon(path: Path, fingerprint: Optional[Dict[str, object]] = None) -> Optional[Lexicon]:
+    """
+    Load a compiled lexicon, or return None if it is missing, from another format version,
+    or (when `fingerprint` is given) built from different sources.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    buf = path.read_bytes()
+    if len(buf) < _PREFIX.size:
+        return None
+    magic, version, header_len = _PREFIX.unpack_from(buf, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    header = json.loads(bytes(buf[_PREFIX.size : _PREFIX.size + header_len]).decode("utf-8"))
+    if fingerprint is not None and header["sources"] != fingerprint:
+        return None
+
+    base = _PREFIX.size + header_len
+    view = memoryview(buf)
+
+    def section(name: str) -> memoryview:
+        start, length = header["sections"][name]
+        return view[base + start : base + start + length]
+
+    words = bytes(section("words")).decode("utf-8").split("\n") if header["n_words"] else []
+    freqs = section("freqs").cast("I")
+    if sys.byteorder != "little":
+        freqs = struct.unpack(f"<{len(words)}I", section("freqs"))
+    vocab = Counter(dict(zip(words, freqs)))
+
+    variants = {}
+    raw_variants = bytes(section("variants")).decode("utf-8")
+    if raw_variants:
+        for line in raw_variants.split("\n"):
+            variant, canonical = line.split("\t", 1)
+            variants[variant] = canonical
+
+    lemmas = json.loads(bytes(section("lemmas")).decode("utf-8"))
+    return Lexicon(vocab, lemmas, variant_to_canonical=variants)
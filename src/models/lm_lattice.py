@@ -0,0 +1,99 @@
+"""
+Incremental KenLM scoring over a candidate lattice.
+
+Instead of re-scoring the whole sentence for every candidate, each hypothesis carries its
+KenLM `State` forward so a candidate only costs the n-gram lookups of the words it adds.
+A beam search over the lattice replaces the greedy left-to-right choice.
+"""
+
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import kenlm
+
+# One lattice column: (candidate strings, whitespace following the token)
+LatticeColumn = Tuple[Sequence[str], str]
+
+
+class _Hypothesis(NamedTuple):
+    score: float  # accumulated log10 probability of completed words
+    n_words: int
+    state: "kenlm.State"
+    pending: str  # text of a word that is still being glued together (no whitespace yet)
+    path: Optional[tuple]  # (choice, parent_path) linked list, avoids copying prefixes
+
+
+def _unwind(path: Optional[tuple]) -> List[str]:
+    choices: List[str] = []
+    while path is not None:
+        choice, path = path
+        choices.append(choice)
+    choices.reverse()
+    return choices
+
+
+class LatticeScorer:
+    def __init__(self, model: "kenlm.Model", beam_size: int = 8):
+        self.model = model
+        self.beam_size = max(int(beam_size), 1)
+
+    def _feed(self, score: float, n_words: int, state: "kenlm.State", text: str):
+        """Score every whitespace-delimited word in `text`, returning the advanced hypothesis parts."""
+        for word in text.split():
+            out = kenlm.State()
+            score += self.model.BaseScore(state, word, out)
+            state = out
+            n_words += 1
+        return score, n_words, state
+
+    @staticmethod
+    def _rank(hyp: _Hypothesis) -> float:
+        return hyp.score / max(hyp.n_words, 1)
+
+    def search(
+        self, lattice: Sequence[LatticeColumn], k: int = 1, beam_size: Optional[int] = None
+    ) -> List[Tuple[List[str], float]]:
+        """
+        Return up to `k` best paths through the lattice as (choices, score) pairs.
+        `beam_size` overrides the scorer's beam for this search.
+
+        Scores match `LMModel.score` on the reconstructed sentence: log10 probability with
+        sentence boundaries, divided by the number of whitespace-delimited words.
+        """
+        start = kenlm.State()
+        self.model.BeginSentenceWrite(start)
+        beam = [_Hypothesis(0.0, 0, start, "", None)]
+        width = max(beam_size or self.beam_size, k)
+        recombine = k == 1
+
+        for candidates, ws in lattice:
+            expanded = {}
+            for hyp in beam:
+                for cand in candidates:
+                    pending = hyp.pending + cand
+                    score, n_words, state = hyp.score, hyp.n_words, hyp.state
+                    if ws:
+                        score, n_words, state = self._feed(score, n_words, state, pending)
+                        pending = ""
+                    new = _Hypothesis(score, n_words, state, pending, (cand, hyp.path))
+                    # Recombine hypotheses that KenLM can no longer tell apart; n-best
+                    # searches keep them so distinct sentences with equal state survive.
+                    key = (state, pending, n_words) if recombine else len(expanded)
+                    old = expanded.get(key)
+                    if old is None or score > old.score:
+                        expanded[key] = new
+            beam = sorted(expanded.values(), key=self._rank, reverse=True)[:width]
+
+        finished = []
+        for hyp in beam:
+            score, n_words, state = self._feed(hyp.score, hyp.n_words, hyp.state, hyp.pending)
+            out = kenlm.State()
+            score += self.model.BaseScore(state, "</s>", out)
+            finished.append((_unwind(hyp.path), score / max(n_words, 1)))
+        finished.sort(key=lambda item: item[1], reverse=True)
+        return finished[:k]
+
+    def best_path(self, lattice: Sequence[LatticeColumn]) -> Tuple[List[str], float]:
+        results = self.search(lattice, k=1)
+        if not results:
+            return [], float("-inf")
+        return results[0]
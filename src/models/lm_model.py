@@ -1,10 +1,19 @@
-import kenlm
+from src.models.lm_registry import DEFAULT_LOAD_METHOD, get_model
+from src.models.metrics import metrics
 
 class LMModel:
-    def __init__(self, path):
-        self.model = kenlm.Model(path)
+    def __init__(self, path, load_method: str = DEFAULT_LOAD_METHOD):
+        self.model = get_model(path, load_method=load_method)
 
     def score(self, sentence: str) -> float:
+        with metrics.timer("lm"):
+            return self._score(sentence)
+
+    def _score(self, sentence: str) -> float:
         raw = self.model.score(sentence, bos=True, eos=True)
         length = max(len(sentence.split()), 1)
         return raw / length
+
+    def score_many(self, sentences) -> list:
+        with metrics.timer("lm"):
+            return [self._score(sentence) for sentence in sentences]
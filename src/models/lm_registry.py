@@ -0,0 +1,91 @@
+"""
+Process-wide KenLM registry.
+
+Every consumer (LMModel, SpellChecker, CLI helpers) asks the registry for a model so each
+binary is loaded once per process. Memory-mapped load methods let several uvicorn workers
+share the model pages through the OS page cache.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import kenlm
+
+# Names accepted for `load_method`, mapped to kenlm.LoadMethod members
+LOAD_METHODS = {
+    "lazy": "LAZY",  # mmap, pages faulted in on demand
+    "populate_or_lazy": "POPULATE_OR_LAZY",  # mmap and prefault when the OS supports it
+    "populate_or_read": "POPULATE_OR_READ",  # KenLM default: mmap+prefault, else read into RAM
+    "read": "READ",  # private copy in anonymous memory (not shared across processes)
+    "parallel_read": "PARALLEL_READ",
+}
+DEFAULT_LOAD_METHOD = "populate_or_lazy"
+# These copy the model into anonymous memory, which cannot be attributed to the file
+_PRIVATE_METHODS = {"read", "parallel_read"}
+
+_models: Dict[Tuple[str, str], "kenlm.Model"] = {}
+_lock = threading.Lock()
+
+
+def _config(load_method: str) -> "kenlm.Config":
+    if load_method not in LOAD_METHODS:
+        raise ValueError(f"Unknown KenLM load method {load_method!r}; expected one of {sorted(LOAD_METHODS)}")
+    config = kenlm.Config()
+    config.load_method = getattr(kenlm.LoadMethod, LOAD_METHODS[load_method])
+    return config
+
+
+def get_model(path: str, load_method: str = DEFAULT_LOAD_METHOD) -> "kenlm.Model":
+    """Return the shared model for (path, load_method), loading it on first use."""
+    key = (str(Path(path).resolve()), load_method)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = kenlm.Model(key[0], _config(load_method))
+            _models[key] = model
+    return model
+
+
+def release(path: str, load_method: str = DEFAULT_LOAD_METHOD) -> None:
+    """Drop the registry reference; the model is freed once no consumer holds it."""
+    with _lock:
+        _models.pop((str(Path(path).resolve()), load_method), None)
+
+
+def _resident_bytes(path: str) -> Optional[int]:
+    """Resident size of the file's mappings in this process (Linux only, mmap load methods)."""
+    smaps = Path("/proc/self/smaps")
+    if not smaps.exists():
+        return None
+    total = 0
+    in_mapping = False
+    with smaps.open("r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            if "-" in fields[0] and len(fields) >= 5:
+                in_mapping = len(fields) >= 6 and fields[-1] == path
+            elif in_mapping and fields[0] == "Rss:":
+                total += int(fields[1]) * 1024
+    return total
+
+
+def memory_report() -> List[Dict[str, object]]:
+    """Per-model file size and resident memory for every loaded model."""
+    report = []
+    for (path, load_method), _ in list(_models.items()):
+        report.append(
+            {
+                "path": path,
+                "load_method": load_method,
+                "file_bytes": os.path.getsize(path) if os.path.exists(path) else None,
+                "resident_bytes": None if load_method in _PRIVATE_METHODS else _resident_bytes(path),
+            }
+        )
+    return report
@@ -0,0 +1,149 @@
+"""
+Per-stage latency histograms and counters, rendered in Prometheus text format.
+
+Stages are timed with `metrics.timer("parse")` and counters bumped with
+`metrics.inc("tokens_processed", n)`. Set STDTEXT_METRICS=0 to disable collection; timers then
+return a shared no-op context manager and counters return immediately.
+
+`collect_timings()` additionally gathers per-stage milliseconds for the code running inside
+it, which is how a single request can report its own `timings`.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds in seconds; wide enough for tokenizer-only calls up to transformer batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stdtext_request_timings", default=None)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("registry", "stage", "start")
+
+    def __init__(self, registry: "MetricsRegistry", stage: str):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def timer(self, stage: str):
+        if not self.enabled and _request_timings.get() is None:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = Histogram()
+            hist.observe(seconds)
+
+    def inc(self, name: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self, cache_stats: Optional[Dict[str, Dict[str, int]]] = None) -> str:
+        """Prometheus text exposition of all stage histograms, counters and cache stats."""
+        lines: List[str] = []
+        with self._lock:
+            histograms = {k: (list(h.counts), h.total, h.count, h.buckets) for k, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines.append("# HELP stdtext_stage_seconds Time spent per pipeline stage.")
+        lines.append("# TYPE stdtext_stage_seconds histogram")
+        for stage, (counts, total, count, buckets) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'stdtext_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'stdtext_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'stdtext_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'stdtext_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE stdtext_{name}_total counter")
+            lines.append(f"stdtext_{name}_total {value}")
+
+        by_key: Dict[str, List[Tuple[str, int]]] = {}
+        for cache, stats in sorted((cache_stats or {}).items()):
+            for key, value in stats.items():
+                by_key.setdefault(key, []).append((cache, value))
+        for key, samples in sorted(by_key.items()):
+            kind = "gauge" if key in ("entries", "bytes", "disk_bytes") else "counter"
+            metric = f"stdtext_cache_{key}" if kind == "gauge" else f"stdtext_cache_{key}_total"
+            lines.append(f"# TYPE {metric} {kind}")
+            for cache, value in samples:
+                lines.append(f'{metric}{{cache="{cache}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(enabled=os.environ.get("STDTEXT_METRICS", "1") != "0")
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Collect per-stage milliseconds for work done inside the block (same thread/context)."""
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
@@ -0,0 +1,218 @@
+"""
+Incremental learning from accepted corrections.
+
+An accepted sentence is cleaned like the domain corpus (prepare_lm_courpus_domain.clean_line).
+Every segment that is kept:
+- is counted into the spellchecker vocabulary and its fuzzy index (SpellChecker.update_vocab);
+- is parsed once, and its (head_pos, dep, child_pos) triples are added to the PDG counts. Only
+  the (head_pos, dep) rows they touch are recomputed (PDGModel.update).
+
+Each update is appended to a JSONL log before it is applied, and a restarted service replays the
+log. Every `compact_every` records the log is folded into the artifacts the updates belong to:
+- the counts in grammar_stats.json are rewritten with recomputed probabilities;
+- the segments are appended to the corpus, and to its .counts.tsv when the corpus is deduplicated;
+- the log is emptied.
+Retraining from the corpus therefore reproduces the updates. grammar_stats.json records the last
+folded sequence number and the corpus size before the append. A compaction interrupted between
+the steps is finished on the next start instead of being applied twice.
+
+Fold the log into the artifacts offline (with the service stopped):
+    python -m src.models.online_updates --log data/updates.jsonl --corpus data/lm/lm_corpus.txt --pdg data/pdg/grammar_stats.json
+"""
+
+import argparse
+import json
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.models.lexicon import segment_counts_path
+from src.training.prepare_lm_courpus_domain import clean_line
+from src.training.train_pdg import add_counts, count_docs, load_pdg, save_pdg
+
+
+def _encode(triples: Counter) -> Dict[str, int]:
+    return {f"{h}|{d}|{c}": n for (h, d, c), n in triples.items()}
+
+
+def _decode(triples: Dict[str, int]) -> Counter:
+    return Counter({tuple(key.split("|")): n for key, n in triples.items()})
+
+
+class UpdateLog:
+    """Append-only JSONL of updates; each record has a "seq" number that keeps increasing."""
+
+    def __init__(self, path: str, start_seq: int = 0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._drop_torn_tail()
+        records = self.records()
+        self.seq = max([start_seq] + [record["seq"] for record in records])
+
+    def _drop_torn_tail(self) -> None:
+        # A crash mid-append leaves a partial last line; that update was never acknowledged,
+        # and appending after it would corrupt the next record
+        if not self.path.exists():
+            return
+        data = self.path.read_bytes()
+        if data and not data.endswith(b"\n"):
+            with self.path.open("r+b") as f:
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def records(self) -> List[Dict[str, object]]:
+        if not self.path.exists():
+            return []
+        with self.path.open("r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def append(self, record: Dict[str, object]) -> Dict[str, object]:
+        self.seq += 1
+        record = {"seq": self.seq, **record}
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return record
+
+    def clear(self) -> None:
+        self.path.write_text("", encoding="utf-8")
+
+
+def _file_size(path: Optional[Path]) -> int:
+    return path.stat().st_size if path is not None and path.exists() else 0
+
+
+def _append_segments(corpus_path: Path, segments: List[str]) -> None:
+    if not segments:
+        return
+    with corpus_path.open("a", encoding="utf-8") as f:
+        f.write("".join(f"{segment}\n" for segment in segments))
+    counts_path = segment_counts_path(corpus_path)
+    if counts_path.exists():
+        # Repeated segments simply add up when the counts are read
+        with counts_path.open("a", encoding="utf-8") as f:
+            f.write("".join(f"{segment}\t1\n" for segment in segments))
+
+
+def compact(log: UpdateLog, pdg_path: str, corpus_path: Optional[str] = None) -> int:
+    """Fold the logged updates into grammar_stats.json and the corpus; returns how many."""
+    corpus = Path(corpus_path) if corpus_path else None
+    model = load_pdg(pdg_path)
+    applied = model.get("applied_seq", 0)
+    records = log.records()
+    folded = [r for r in records if r["seq"] <= applied]
+    pending = [r for r in records if r["seq"] > applied]
+    if folded and corpus is not None and _file_size(corpus) == model.get("corpus_size", -1):
+        # The previous compaction saved the PDG counts but stopped before the corpus append
+        _append_segments(corpus, [s for r in folded for s in r["segments"]])
+    if pending:
+        triples = Counter()
+        for record in pending:
+            triples.update(_decode(record["triples"]))
+        model = add_counts(model, triples)
+        model["applied_seq"] = pending[-1]["seq"]
+        model["corpus_size"] = _file_size(corpus)
+        save_pdg(model, pdg_path)
+        if corpus is not None:
+            _append_segments(corpus, [s for r in pending for s in r["segments"]])
+    log.clear()
+    return len(pending)
+
+
+def recover(log_path: str, pdg_path: str, corpus_path: Optional[str] = None) -> None:
+    """Finish a compaction that was interrupted; call before the artifacts are loaded."""
+    log = UpdateLog(log_path)
+    applied = load_pdg(pdg_path).get("applied_seq", 0)
+    if any(record["seq"] <= applied for record in log.records()):
+        compact(log, pdg_path, corpus_path)
+
+
+class OnlineUpdater:
+    def __init__(self, spellchecker, pdg, pdg_path: str, corpus_path: Optional[str], log_path: str, compact_every: int = 1000):
+        """
+        `spellchecker` may be None (no vocabulary to update); `pdg` must be loaded from a
+        grammar_stats.json with raw counts. Run `recover` before loading them, then `replay`.
+        Keep one updater per log for the life of the process; `rebind` moves it onto reloaded
+        models.
+        """
+        self.pdg_path = pdg_path
+        self.corpus_path = corpus_path
+        self.compact_every = max(int(compact_every), 1)
+        self._check_counts(pdg)
+        self.spellchecker = spellchecker
+        self.pdg = pdg
+        # Held while an update is logged and applied, and by a reload until its model is in use
+        self.lock = threading.Lock()
+        self.applied_seq = load_pdg(pdg_path).get("applied_seq", 0)
+        self.log = UpdateLog(log_path, start_seq=self.applied_seq)
+
+    def _check_counts(self, pdg) -> None:
+        if pdg.table.counts is None:
+            raise ValueError(f"{self.pdg_path} has no raw counts; online updates need grammar_stats.json from train_pdg")
+
+    def replay(self) -> int:
+        """Apply logged updates that are not yet folded into the artifacts; returns how many."""
+        records = [r for r in self.log.records() if r["seq"] > self.applied_seq]
+        for record in records:
+            self._apply(record["segments"], _decode(record["triples"]))
+        return len(records)
+
+    def rebind(self, spellchecker, pdg) -> int:
+        """
+        Apply further updates to a reloaded spellchecker and PDG, replaying the logged updates
+        they were loaded without; returns how many. Hold `lock` from before they are loaded until
+        the new model is in use, so no update is applied to the old model only.
+        """
+        self._check_counts(pdg)
+        previous = self.spellchecker, self.pdg
+        self.spellchecker, self.pdg = spellchecker, pdg
+        try:
+            return self.replay()
+        except Exception:
+            self.spellchecker, self.pdg = previous
+            raise
+
+    def _apply(self, segments: List[str], triples: Counter) -> Tuple[int, int]:
+        new_words = self.spellchecker.update_vocab(segments) if self.spellchecker else 0
+        rows = self.pdg.update(triples) if triples else 0
+        return new_words, rows
+
+    def accept(self, sentence: str, parse_many) -> Dict[str, object]:
+        """Learn from an accepted sentence; `parse_many` parses its corpus segments."""
+        segments = clean_line(sentence)
+        new_words = rows = compacted = 0
+        if segments:
+            triples, _, _ = count_docs(parse_many(segments))
+        with self.lock:
+            if segments:
+                self.log.append({"segments": segments, "triples": _encode(triples)})
+                new_words, rows = self._apply(segments, triples)
+                if self.log.seq - self.applied_seq >= self.compact_every:
+                    compacted = compact(self.log, self.pdg_path, self.corpus_path)
+                    self.applied_seq = self.log.seq
+            pending = self.log.seq - self.applied_seq
+        return {
+            "segments": len(segments),
+            "new_words": new_words,
+            "pdg_rows_updated": rows,
+            "pending_updates": pending,
+            "compacted": compacted,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold the online update log into the corpus and PDG counts")
+    parser.add_argument("--log", required=True)
+    parser.add_argument("--pdg", default="data/pdg/grammar_stats.json")
+    parser.add_argument("--corpus", default="data/lm/lm_corpus.txt")
+    args = parser.parse_args()
+
+    log = UpdateLog(args.log)
+    folded = compact(log, args.pdg, args.corpus)
+    print(f"Folded {folded} updates into {args.pdg} and {args.corpus}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,45 @@
 import json
-import math
 
-from src.nlp.spacy_pipeline import nlp
+from src.models.metrics import metrics
+from src.models.pdg_table import PDGTable
+from src.nlp.spacy_pipeline import parse
 
 class PDGModel:
-    def __init__(self, path, smoothing=1e-6):
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        self.probs = data["probs"]
+    def __init__(self, path, smoothing=1e-6, backoff: float = 0.0):
+        """
+        Load PDG statistics from grammar_stats.json, or from a table compiled with
+        `python -m src.models.pdg_table` (.npz). `backoff` > 0 smooths unseen triples with
+        P(child | dep) and P(child) instead of the fixed `smoothing` floor (JSON input only).
+        """
+        if str(path).endswith(".npz"):
+            self.table = PDGTable.load(path)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.table = PDGTable.from_model(data, smoothing=smoothing, backoff=backoff)
         self.smoothing = smoothing
+        self.backoff = backoff
+
+    def update(self, triples) -> int:
+        """
+        Add (head_pos, dep, child_pos) counts; returns the number of (head_pos, dep) rows
+        recomputed. Needs a model loaded from JSON with raw counts.
+        """
+        if self.table.knows(triples):
+            return self.table.add_counts(triples)
+        # A new label changes the table shape: rebuild it and swap it in whole
+        merged = self.table.triple_counts()
+        merged.update(triples)
+        self.table = PDGTable.from_counts(merged, smoothing=self.smoothing, backoff=self.backoff)
+        return len({(h, d) for h, d, _ in merged})
 
     def score(self, sentence: str) -> float:
-        doc = nlp(sentence)
-        logps = []
-        for tok in doc:
-            p = (
-                self.probs
-                .get(tok.head.pos_, {})
-                .get(tok.dep_, {})
-                .get(tok.pos_, self.smoothing)
-            )
-            logps.append(math.log(p))
-        return sum(logps) / max(len(logps), 1)
+        return self.score_doc(parse(sentence))
+
+    def score_doc(self, doc) -> float:
+        """Score an already parsed Doc, so callers can reuse a single parse."""
+        return self.score_docs([doc])[0]
+
+    def score_docs(self, docs) -> list:
+        with metrics.timer("pdg"):
+            return self.table.score_docs(docs)
@@ -0,0 +1,245 @@
+"""
+Compiled PDG probability table.
+
+POS and dependency labels are interned to integer ids and log P(child_pos | head_pos, dep) is
+precomputed into a dense (head_pos, dep, child_pos) tensor. The last id on each axis stands for
+labels unseen in training. A Doc, or a whole batch of Docs, is scored with one gather over the
+id arrays taken from `Doc.to_array`.
+
+A table built from raw counts keeps them, so `add_counts` can fold in new triples and recompute
+only the (head_pos, dep) rows they touch (see src/models/online_updates.py).
+
+Convert a trained model:
+    python -m src.models.pdg_table --input data/pdg/grammar_stats.json --output data/pdg/grammar_stats.npz
+"""
+
+import argparse
+import json
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+class PDGTable:
+    def __init__(
+        self,
+        pos_labels: Sequence[str],
+        dep_labels: Sequence[str],
+        logp: np.ndarray,
+        smoothing: float,
+        counts: Optional[np.ndarray] = None,
+        backoff: float = 0.0,
+    ):
+        self.pos_labels = list(pos_labels)
+        self.dep_labels = list(dep_labels)
+        self.pos_ids = {label: i for i, label in enumerate(self.pos_labels)}
+        self.dep_ids = {label: i for i, label in enumerate(self.dep_labels)}
+        self.logp = logp
+        self.smoothing = smoothing
+        # Raw triple counts in the layout of logp; None for tables built from probabilities
+        self.counts = counts
+        self.backoff = backoff
+        # spaCy hash/symbol id -> our id, filled lazily per label
+        self._pos_by_hash: Dict[int, int] = {}
+        self._dep_by_hash: Dict[int, int] = {}
+
+    @property
+    def unknown_pos(self) -> int:
+        return len(self.pos_labels)
+
+    @property
+    def unknown_dep(self) -> int:
+        return len(self.dep_labels)
+
+    @classmethod
+    def _empty(cls, pos_labels, dep_labels, smoothing: float) -> np.ndarray:
+        shape = (len(pos_labels) + 1, len(dep_labels) + 1, len(pos_labels) + 1)
+        return np.full(shape, np.log(smoothing), dtype=np.float64)
+
+    @classmethod
+    def from_probs(cls, probs: Dict[str, Dict[str, Dict[str, float]]], smoothing: float = 1e-6) -> "PDGTable":
+        """Build from the nested head_pos -> dep -> child_pos -> prob dict in grammar_stats.json."""
+        pos_labels = sorted({h for h in probs} | {c for deps in probs.values() for kids in deps.values() for c in kids})
+        dep_labels = sorted({d for deps in probs.values() for d in deps})
+        table = cls(pos_labels, dep_labels, cls._empty(pos_labels, dep_labels, smoothing), smoothing)
+        for head, deps in probs.items():
+            for dep, kids in deps.items():
+                for child, p in kids.items():
+                    table.logp[table.pos_ids[head], table.dep_ids[dep], table.pos_ids[child]] = np.log(p)
+        return table
+
+    @classmethod
+    def from_counts(
+        cls,
+        triple_counts: Dict[Tuple[str, str, str], int],
+        smoothing: float = 1e-6,
+        backoff: float = 1.0,
+    ) -> "PDGTable":
+        """
+        Build with hierarchical backoff instead of a fixed floor:
+            P(c | h, d) = (n(h, d, c) + backoff * P(c | d)) / (n(h, d) + backoff)
+            P(c | d)    = (n(d, c) + backoff * P(c)) / (n(d) + backoff)
+        P(c) is the unigram child POS distribution, floored at `smoothing`. backoff=0 reproduces
+        the relative frequencies used by `from_probs`. The counts are kept for `add_counts`.
+        """
+        pos_labels = sorted({h for h, _, _ in triple_counts} | {c for _, _, c in triple_counts})
+        dep_labels = sorted({d for _, d, _ in triple_counts})
+        n_pos, n_dep = len(pos_labels), len(dep_labels)
+        pos_ids = {label: i for i, label in enumerate(pos_labels)}
+        dep_ids = {label: i for i, label in enumerate(dep_labels)}
+
+        counts = np.zeros((n_pos + 1, n_dep + 1, n_pos + 1), dtype=np.float64)
+        for (h, d, c), n in triple_counts.items():
+            counts[pos_ids[h], dep_ids[d], pos_ids[c]] += n
+
+        child = counts.sum(axis=(0, 1))
+        p_child = np.maximum(child / max(child.sum(), 1.0), smoothing)
+        dep_child = counts.sum(axis=0)
+        head_dep = counts.sum(axis=2, keepdims=True)
+        # Rows without counts divide 0 by 0 when backoff is 0; they fall back to the floor below
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_dep = (dep_child + backoff * p_child) / (dep_child.sum(axis=1, keepdims=True) + backoff)
+            p = (counts + backoff * p_dep[None, :, :]) / (head_dep + backoff)
+        p = np.where(np.isfinite(p), p, 0.0)
+        logp = np.log(np.maximum(p, smoothing))
+        return cls(pos_labels, dep_labels, logp, smoothing, counts=counts, backoff=backoff)
+
+    @classmethod
+    def from_model(cls, data: Dict[str, object], smoothing: float = 1e-6, backoff: float = 0.0) -> "PDGTable":
+        """
+        Build from a grammar_stats.json payload. With raw triple counts (every model written by
+        train_pdg has them) the table keeps the counts and can be updated; backoff needs them.
+        """
+        if data.get("triple_counts"):
+            triples = {tuple(k.split("|")): n for k, n in data["triple_counts"].items()}
+            return cls.from_counts(triples, smoothing=smoothing, backoff=backoff)
+        return cls.from_probs(data["probs"], smoothing=smoothing)
+
+    def triple_counts(self) -> Counter:
+        """The raw counts as (head_pos, dep, child_pos) -> count."""
+        if self.counts is None:
+            raise ValueError("this PDG table was built without raw counts")
+        pos = self.pos_labels
+        dep = self.dep_labels
+        return Counter(
+            {(pos[h], dep[d], pos[c]): int(n) for (h, d, c), n in zip(np.argwhere(self.counts), self.counts[self.counts > 0])}
+        )
+
+    def knows(self, triples: Iterable[Tuple[str, str, str]]) -> bool:
+        """True if every label in `triples` already has an id, so `add_counts` needs no rebuild."""
+        return all(h in self.pos_ids and d in self.dep_ids and c in self.pos_ids for h, d, c in triples)
+
+    def add_counts(self, triples: Mapping[Tuple[str, str, str], int]) -> int:
+        """
+        Add triple counts and recompute the (head_pos, dep) rows they touch; returns how many.
+        All labels must be known (see `knows`); new labels change the table shape and need a
+        rebuild with `from_counts`. With backoff, untouched rows keep their P(c | d) and P(c)
+        until the next rebuild.
+        """
+        if self.counts is None:
+            raise ValueError("this PDG table was built without raw counts")
+        rows = set()
+        for (h, d, c), n in triples.items():
+            row = (self.pos_ids[h], self.dep_ids[d])
+            self.counts[row[0], row[1], self.pos_ids[c]] += n
+            rows.add(row)
+        self._recompute_rows(rows)
+        return len(rows)
+
+    def _recompute_rows(self, rows: Iterable[Tuple[int, int]]) -> None:
+        # Same formulas as from_counts, evaluated for single rows
+        counts, backoff = self.counts, self.backoff
+        if backoff > 0:
+            child = counts.sum(axis=(0, 1))
+            p_child = np.maximum(child / max(child.sum(), 1.0), self.smoothing)
+        for h, d in rows:
+            row = counts[h, d]
+            total = row.sum()
+            if backoff > 0:
+                dep_child = counts[:, d, :].sum(axis=0)
+                p_dep = (dep_child + backoff * p_child) / (dep_child.sum() + backoff)
+                p = (row + backoff * p_dep) / (total + backoff)
+            else:
+                p = row / total if total else np.zeros_like(row)
+            # Assign the finished row at once; scoring threads read logp without a lock
+            self.logp[h, d] = np.log(np.maximum(p, self.smoothing))
+
+    def save(self, path: str) -> None:
+        labels = json.dumps({"version": FORMAT_VERSION, "pos": self.pos_labels, "dep": self.dep_labels, "smoothing": self.smoothing})
+        with open(path, "wb") as f:
+            np.savez(f, logp=self.logp, labels=np.frombuffer(labels.encode("utf-8"), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path: str) -> "PDGTable":
+        with np.load(path) as data:
+            labels = json.loads(data["labels"].tobytes().decode("utf-8"))
+            if labels.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported PDG table version in {path}: {labels.get('version')}")
+            return cls(labels["pos"], labels["dep"], data["logp"], labels["smoothing"])
+
+    def _map(self, values: np.ndarray, strings, by_hash: Dict[int, int], ids: Dict[str, int], unknown: int) -> np.ndarray:
+        """Map spaCy attribute ids to table ids; only the few distinct labels go through Python."""
+        uniq, inverse = np.unique(values, return_inverse=True)
+        mapped = np.empty(len(uniq), dtype=np.intp)
+        for i, value in enumerate(uniq.tolist()):
+            table_id = by_hash.get(value)
+            if table_id is None:
+                table_id = ids.get(strings[value], unknown) if value else unknown
+                by_hash[value] = table_id
+            mapped[i] = table_id
+        return mapped[inverse]
+
+    def doc_ids(self, doc) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(head_pos, dep, child_pos) id arrays for every token in the Doc."""
+        from spacy.attrs import DEP, HEAD, POS
+
+        if len(doc) == 0:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty, empty
+        arr = doc.to_array([POS, DEP, HEAD])
+        strings = doc.vocab.strings
+        pos = self._map(arr[:, 0], strings, self._pos_by_hash, self.pos_ids, self.unknown_pos)
+        dep = self._map(arr[:, 1], strings, self._dep_by_hash, self.dep_ids, self.unknown_dep)
+        # HEAD is stored as a relative offset in an unsigned array
+        heads = np.arange(len(doc)) + arr[:, 2].astype(np.int64)
+        return pos[heads], dep, pos
+
+    def score_ids(self, head_pos: np.ndarray, dep: np.ndarray, child_pos: np.ndarray) -> np.ndarray:
+        return self.logp[head_pos, dep, child_pos]
+
+    def score_docs(self, docs: Sequence) -> List[float]:
+        """Mean log-probability per Doc, computed with a single gather over the whole batch."""
+        parts = [self.doc_ids(doc) for doc in docs]
+        if not parts:
+            return []
+        lengths = np.array([len(p[0]) for p in parts])
+        if lengths.sum() == 0:
+            return [0.0] * len(parts)
+        logps = self.score_ids(*(np.concatenate([p[i] for p in parts]) for i in range(3)))
+        sums = np.zeros(len(parts), dtype=np.float64)
+        nonempty = lengths > 0
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        sums[nonempty] = np.add.reduceat(logps, starts[nonempty])
+        return (sums / np.maximum(lengths, 1)).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile grammar_stats.json into a binary PDG table")
+    parser.add_argument("--input", default="data/pdg/grammar_stats.json")
+    parser.add_argument("--output", default="data/pdg/grammar_stats.npz")
+    parser.add_argument("--smoothing", type=float, default=1e-6, help="Probability floor")
+    parser.add_argument("--backoff", type=float, default=0.0, help="Backoff strength (0 = plain relative frequencies)")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    table = PDGTable.from_model(data, smoothing=args.smoothing, backoff=args.backoff)
+    table.save(args.output)
+    print(f"Wrote {table.logp.shape} PDG table → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
-import difflib
-import json
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional
 
 import kenlm
 
-from src.nlp.spacy_pipeline import nlp
+from src.models.cache import LRUCache
+from src.models.lemma_index import LemmaIndex
+from src.models.lexicon import load_lexicon, load_text_lexicon, source_fingerprint
+from src.models.lm_lattice import LatticeScorer
+from src.models.lm_registry import DEFAULT_LOAD_METHOD, get_model
+from src.models.metrics import metrics
+from src.models.symspell import SymSpellIndex
+from src.nlp.spacy_pipeline import tokenize
 
 
 class SpellChecker:
@@ -15,83 +21,103 @@ class SpellChecker:
         cutoff: float = 0.8,
         lm_path: Optional[str] = None,
         lemma_path: Optional[str] = None,
+        beam_size: int = 8,
+        lm_load_method: str = DEFAULT_LOAD_METHOD,
+        lexicon_path: Optional[str] = None,
+        suggest_cache_size: int = 16384,
+        fast_path: bool = True,
+        fast_path_min_count: int = 10,
+        fast_path_min_order: int = 2,
+        fast_path_min_logprob: float = -3.0,
+        nbest_beam_size: int = 16,
+        max_nbest: int = 10,
     ):
+        """
+        With `fast_path`, a token skips candidate generation and LM trials when it occurs at
+        least `fast_path_min_count` times in the corpus, is not a known variant or domain fix,
+        and KenLM scores it in its original context with an n-gram of at least
+        `fast_path_min_order` words and a log10 probability of at least `fast_path_min_logprob`.
+
+        `correct_nbest` searches with a beam of `nbest_beam_size` and returns at most `max_nbest`
+        sentences, whatever the caller asks for.
+        """
         self.corpus_path = Path(corpus_path)
         self.cutoff = cutoff
-        self.vocab = self._load_vocab()
-        self.lm = kenlm.Model(lm_path) if lm_path else None
-        self.lemmas = self._load_lemmas(lemma_path)
-        self.variant_to_canonical = self._build_variant_lookup(self.lemmas)
-        self.canonicals_by_cat = {cat: set(items.keys()) for cat, items in self.lemmas.items()}
+        # Prefer the compiled lexicon (src/training/compile_lexicon.py) when it matches the sources
+        lexicon_path = Path(lexicon_path) if lexicon_path else self.corpus_path.with_name("lexicon.bin")
+        lexicon = load_lexicon(lexicon_path, source_fingerprint(self.corpus_path, lemma_path))
+        if lexicon is None:
+            lexicon = load_text_lexicon(self.corpus_path, lemma_path)
+        self.vocab = lexicon.vocab
+        # Built on first use (see vocab_index); indexing costs far more than loading the lexicon
+        self._vocab_index: Optional[SymSpellIndex] = None
+        self._index_lock = threading.Lock()
+        self.lm = get_model(lm_path, load_method=lm_load_method) if lm_path else None
+        self.lattice_scorer = LatticeScorer(self.lm, beam_size=beam_size) if self.lm else None
+        self.lemmas = lexicon.lemmas
+        self.variant_to_canonical = lexicon.variant_to_canonical
+        self.canonicals_by_cat = lexicon.canonicals_by_cat
+        self.lemma_path = lemma_path
+        self.lemma_index = LemmaIndex(self.lemmas)
+        # (token, prev_like_num) -> suggestion; cleared when the vocabulary is updated
+        self.suggest_cache = LRUCache(max_items=suggest_cache_size)
         # Domain-specific fixes that are faster than fuzzy matching
         self.domain_map = {
             "instal": "installation",
             "køken": "køkken",
         }
+        # The fast path needs the LM to judge the context
+        self.fast_path = fast_path and self.lm is not None
+        self.fast_path_min_count = fast_path_min_count
+        self.fast_path_min_order = fast_path_min_order
+        self.fast_path_min_logprob = fast_path_min_logprob
+        self.nbest_beam_size = max(int(nbest_beam_size), 1)
+        self.max_nbest = max(int(max_nbest), 1)
+
+    @property
+    def vocab_index(self) -> SymSpellIndex:
+        """Delete index over the vocabulary, built on the first suggestion lookup."""
+        index = self._vocab_index
+        if index is None:
+            with self._index_lock:
+                if self._vocab_index is None:
+                    self._vocab_index = SymSpellIndex(self.vocab)
+                index = self._vocab_index
+        return index
 
-    def _load_vocab(self) -> set:
-        vocab = set()
-        if not self.corpus_path.exists():
-            return vocab
-
-        with self.corpus_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                for token in line.strip().split():
-                    vocab.add(token.lower())
-        return vocab
+    def _nearest_lemma(self, token: str, categories: List[str], cutoff: float = 0.75) -> Optional[str]:
+        """Fuzzy match token to a canonical (via the canonical or any variant) within the given categories."""
+        matches = self.lemma_index.lookup(token.lower(), categories, cutoff=cutoff, n=1)
+        return matches[0].canonical if matches else None
 
-    def _load_lemmas(self, lemma_path: Optional[str]) -> Dict[str, Dict[str, List[str]]]:
+    def update_vocab(self, segments: List[str]) -> int:
         """
-        Load lemma variants keyed by category, preserving canonical -> variants mapping.
-        Expected schema:
-        {
-          "actions": { "installation": ["instal", ...], ... },
-          "objects": { "køkken": ["køken"], ... },
-          "abbreviations": { "afbryder": ["afb", "afb."], ... }
-        }
+        Count the tokens of corpus segments into the vocabulary and the fuzzy index in place,
+        tokenized like read_vocab; returns how many words were new.
         """
-        empty = {"actions": {}, "objects": {}, "abbreviations": {}}
-        if not lemma_path:
-            return empty
-        path = Path(lemma_path)
-        if not path.exists():
-            return empty
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-        except json.JSONDecodeError:
-            return empty
-
-        def norm(cat: str) -> Dict[str, List[str]]:
-            raw = data.get(cat, {}) or {}
-            return {k.lower(): [str(v).lower() for v in (vals or [])] for k, vals in raw.items()}
-
-        return {
-            "actions": norm("actions"),
-            "objects": norm("objects"),
-            "abbreviations": norm("abbreviations"),
-        }
-
-    def _build_variant_lookup(self, lemmas: Dict[str, Dict[str, List[str]]]) -> Dict[str, str]:
-        """Flatten variant -> canonical across categories."""
-        lookup: Dict[str, str] = {}
-        for cat_map in lemmas.values():
-            for canonical, variants in cat_map.items():
-                lookup[canonical] = canonical
-                for v in variants:
-                    lookup[v] = canonical
-        return lookup
-
-    def _nearest_lemma(self, token: str, categories: List[str], cutoff: float = 0.75) -> Optional[str]:
-        """Fuzzy match token to canonical within the given categories."""
-        candidates = []
-        for cat in categories:
-            candidates.extend(self.canonicals_by_cat.get(cat, []))
-        if not candidates:
-            return None
-        matches = difflib.get_close_matches(token.lower(), candidates, n=1, cutoff=cutoff)
-        return matches[0] if matches else None
+        new_words = 0
+        # An index that is not built yet picks the new counts up from the vocabulary
+        with self._index_lock:
+            for segment in segments:
+                for token in segment.split():
+                    token = token.lower()
+                    new_words += token not in self.vocab
+                    self.vocab[token] += 1
+                    if self._vocab_index is not None:
+                        self._vocab_index.add(token)
+        self.suggest_cache.clear()
+        return new_words
 
     def suggest(self, token: str, prev_like_num: bool = False) -> str:
+        key = (token, prev_like_num)
+        suggestion = self.suggest_cache.get(key)
+        if suggestion is None:
+            with metrics.timer("suggest"):
+                suggestion = self._suggest(token, prev_like_num)
+            self.suggest_cache.put(key, suggestion)
+        return suggestion
+
+    def _suggest(self, token: str, prev_like_num: bool) -> str:
         lower = token.lower()
         if lower in self.vocab or not token.isalpha():
             return token
@@ -111,10 +137,9 @@ class SpellChecker:
         if prev_like_num and lower == "lampe":
             lower = "lamper"
 
-        matches = difflib.get_close_matches(lower, self.vocab, n=1, cutoff=self.cutoff)
-        if not matches:
-            # Fallback with looser cutoff to avoid leaving obvious typos unchanged
-            matches = difflib.get_close_matches(lower, self.vocab, n=1, cutoff=0.6)
+        # The best match above the looser 0.6 cutoff is also the best above self.cutoff when one
+        # exists, so a single indexed lookup covers the strict pass and its fallback.
+        matches = self.vocab_index.lookup(lower, cutoff=min(self.cutoff, 0.6), n=1)
 
         suggestion = matches[0] if matches else lower
         if token.istitle():
@@ -123,101 +148,200 @@ class SpellChecker:
             suggestion = suggestion.upper()
         return suggestion
 
-    def _lm_score_from_tokens(self, tokens: List[Dict[str, str]]) -> float:
-        if not self.lm:
-            return float("-inf")
-        sentence = "".join([t["text"] + t["ws"] for t in tokens])
-        raw = self.lm.score(sentence, bos=True, eos=True)
-        length = max(len(sentence.split()), 1)
-        return raw / length
-
     def _generate_inflection_candidates(self, token: str, prev_like_num: bool) -> List[str]:
         lower = token.lower()
-        candidates = set([token])
+        candidates = [token]
 
         # Lemma variant/direct lookup
         canonical = self.variant_to_canonical.get(lower)
         if canonical:
-            candidates.add(canonical)
+            candidates.append(canonical)
         else:
             nearest = self._nearest_lemma(lower, ["actions", "objects", "abbreviations"])
             if nearest:
-                candidates.add(nearest)
+                candidates.append(nearest)
 
         # Domain remaps
         if lower in self.domain_map:
-            candidates.add(self.domain_map[lower])
+            candidates.append(self.domain_map[lower])
 
         # Quick pluralization/lemmatization heuristics
         if prev_like_num:
             if lower.endswith("e"):
-                candidates.add(lower + "r")  # lampe -> lamper
+                candidates.append(lower + "r")  # lampe -> lamper
             else:
-                candidates.add(lower + "er")
+                candidates.append(lower + "er")
         else:
             if lower.endswith("er"):
-                candidates.add(lower[:-2])  # lamper -> lampe
+                candidates.append(lower[:-2])  # lamper -> lampe
             if lower.endswith("e"):
-                candidates.add(lower[:-1])  # installatione -> installation (edge)
-
-        # Add fuzzy guess
-        candidates.add(self.suggest(token, prev_like_num=prev_like_num))
-
-        return list(candidates)
-
-    def correct(self, sentence: str) -> Dict[str, object]:
-        doc = nlp(sentence)
-
-        corrected_tokens: List[Dict[str, str]] = []
-        corrections: List[Dict[str, object]] = []
-
-        for tok in doc:
-            prev_like_num = tok.i > 0 and doc[tok.i - 1].like_num
-            candidates = self._generate_inflection_candidates(tok.text, prev_like_num=prev_like_num)
-
-            # Choose best candidate by LM when available; otherwise pick first (which includes fuzzy)
-            best = tok.text
-            best_score = None
-            for cand in candidates:
-                trial_tokens = corrected_tokens + [{"text": cand, "ws": tok.whitespace_}] + [
-                    {"text": t.text, "ws": t.whitespace_} for t in doc[tok.i + 1 :]
-                ]
-                score = self._lm_score_from_tokens(trial_tokens) if self.lm else None
-                if best_score is None or (score is not None and score > best_score):
-                    best_score = score if score is not None else best_score
-                    best = cand
-
-            corrected_tokens.append({"text": best, "ws": tok.whitespace_})
-
-            if best != tok.text:
-                corrections.append(
-                    {
-                        "original": tok.text,
-                        "suggestion": best,
-                        "position": tok.i,
-                    }
-                )
-
-        # Heuristic reorder: move trailing "installation" to the front and insert "af"
-        # when the sentence starts with a number (e.g., "2 lampe ... installation").
-        if corrected_tokens:
-            first_is_num = doc[0].like_num
-            install_idx = next(
-                (i for i, t in enumerate(corrected_tokens) if t["text"].lower() == "installation"),
-                None,
-            )
-            if first_is_num and install_idx not in (None, 0):
-                install_token = corrected_tokens.pop(install_idx)
-                # Ensure we leave a space after moving installation to the front
-                install_token["ws"] = install_token.get("ws", " ") or " "
-                needs_af = not corrected_tokens or corrected_tokens[0]["text"].lower() != "af"
-                prefix = [install_token]
-                if needs_af:
-                    prefix.append({"text": "af", "ws": " "})
-                corrected_tokens = prefix + corrected_tokens
-
-        corrected_sentence = "".join([t["text"] + t["ws"] for t in corrected_tokens])
+                candidates.append(lower[:-1])  # installatione -> installation (edge)
+
+        # Add fuzzy guess last; it is the choice when no LM is loaded
+        fuzzy = self.suggest(token, prev_like_num=prev_like_num)
+
+        # Deduplicate in insertion order so ties in the lattice search break the same way every run
+        return [c for c in dict.fromkeys(candidates) if c != fuzzy] + [fuzzy]
+
+    def correct(self, sentence: str, doc=None) -> Dict[str, object]:
+        """
+        Correct a sentence token by token.
+
+        Pass `doc` when the caller already parsed `sentence` to avoid a second pipeline run.
+        Correction only reads token text, whitespace and like_num, so on its own it just tokenizes.
+        """
+        if doc is None:
+            doc = tokenize(sentence)
+
+        with metrics.timer("correct"):
+            return self._correct(doc)
+
+    def _is_confident(self, word: str, full_score, prev_like_num: bool) -> bool:
+        lower = word.lower()
+        return (
+            # Numerals trigger the plural heuristics, so the next token always gets candidates
+            not prev_like_num
+            and self.vocab.get(lower, 0) >= self.fast_path_min_count
+            and self.variant_to_canonical.get(lower, lower) == lower
+            and lower not in self.domain_map
+            and full_score.ngram_length >= self.fast_path_min_order
+            and full_score.log_prob >= self.fast_path_min_logprob
+        )
+
+    def _confident_tokens(self, words: List[str], spaces: List[str], like_num: List[bool]) -> List[bool]:
+        """Mark tokens that take the fast path, scoring the original sentence once with KenLM."""
+        confident = [False] * len(words)
+        if not self.fast_path:
+            return confident
+        state = kenlm.State()
+        self.lm.BeginSentenceWrite(state)
+        start = 0
+        for i, ws in enumerate(spaces):
+            # Tokens without trailing whitespace are glued into one LM word, as in the lattice
+            if not ws and i < len(words) - 1:
+                continue
+            lm_words = "".join(words[start : i + 1]).split()
+            full_score = None
+            for word in lm_words:
+                out = kenlm.State()
+                full_score = self.lm.BaseFullScore(state, word, out)
+                state = out
+            # Only a token that is a whole LM word on its own can be judged in isolation
+            if i == start and len(lm_words) == 1:
+                confident[i] = self._is_confident(words[i], full_score, prev_like_num=i > 0 and like_num[i - 1])
+            start = i + 1
+        return confident
+
+    def correct_nbest(self, sentence: str, k: int = 5, doc=None) -> List[Dict[str, object]]:
+        """
+        Up to `k` distinct corrections of a sentence, best LM score first.
+
+        The lattice is built once and searched for the k best paths; each result carries the
+        LM score of its path from that search, so no sentence is re-scored. `lm_score` is None
+        when the "installation" reorder changed the word order after the search, and without an
+        LM only the single greedy correction is returned.
+        """
+        if doc is None:
+            doc = tokenize(sentence)
+
+        with metrics.timer("correct"):
+            words, spaces, like_num = self._token_arrays(doc)
+            lattice, fast_path_tokens = self._build_lattice(words, spaces, like_num)
+            if self.lattice_scorer:
+                k = min(max(int(k), 1), self.max_nbest)
+                with metrics.timer("lm_search"):
+                    paths = self.lattice_scorer.search(lattice, k=k, beam_size=self.nbest_beam_size)
+            else:
+                paths = [([candidates[-1] for candidates, _ in lattice], None)]
+
+        starts_with_number = bool(like_num) and like_num[0]
+        results: Dict[str, Dict[str, object]] = {}
+        for choices, lm_score in paths:
+            rendered = render_tokens(choices, spaces, starts_with_number=starts_with_number)
+            if rendered in results:
+                # Different splits of glued tokens can spell the same sentence
+                continue
+            if lm_score is not None and rendered != "".join(w + ws for w, ws in zip(choices, spaces)):
+                lm_score = None
+            results[rendered] = {
+                "corrected_sentence": rendered,
+                "corrections": self._corrections(words, choices),
+                "lm_score": lm_score,
+                "fast_path_tokens": fast_path_tokens,
+            }
+        return list(results.values())
+
+    @staticmethod
+    def _token_arrays(doc):
+        # Read the Doc once into parallel arrays; everything else works on indices into them
+        words = [tok.text for tok in doc]
+        spaces = [tok.whitespace_ for tok in doc]
+        like_num = [tok.like_num for tok in doc]
+        return words, spaces, like_num
+
+    def _build_lattice(self, words: List[str], spaces: List[str], like_num: List[bool]):
+        """Candidate lattice for the tokens plus the number of tokens the fast path accepted."""
+        lattice = []
+        with metrics.timer("candidates"):
+            confident = self._confident_tokens(words, spaces, like_num)
+            for i, word in enumerate(words):
+                if confident[i]:
+                    lattice.append(([word], spaces[i]))
+                    continue
+                prev_like_num = i > 0 and like_num[i - 1]
+                candidates = self._generate_inflection_candidates(word, prev_like_num=prev_like_num)
+                lattice.append((candidates, spaces[i]))
+        fast_path_tokens = sum(confident)
+        if metrics.enabled:
+            metrics.inc("tokens_processed", len(words))
+            metrics.inc("fast_path_tokens", fast_path_tokens)
+            metrics.inc("candidates_generated", sum(len(candidates) for candidates, _ in lattice))
+            metrics.inc("oov_tokens", sum(1 for word in words if word.lower() not in self.vocab))
+        return lattice, fast_path_tokens
+
+    @staticmethod
+    def _corrections(words: List[str], choices: List[str]) -> List[Dict[str, object]]:
+        return [
+            {"original": word, "suggestion": best, "position": i}
+            for i, (word, best) in enumerate(zip(words, choices))
+            if best != word
+        ]
+
+    def _correct(self, doc) -> Dict[str, object]:
+        words, spaces, like_num = self._token_arrays(doc)
+
+        # Build the candidate lattice once, then pick the best path with incremental LM scoring
+        lattice, fast_path_tokens = self._build_lattice(words, spaces, like_num)
+
+        if self.lattice_scorer:
+            with metrics.timer("lm_search"):
+                choices, _ = self.lattice_scorer.best_path(lattice)
+        else:
+            # Without an LM every candidate ties; keep the historical pick of the last one
+            choices = [candidates[-1] for candidates, _ in lattice]
+
         return {
-            "corrected_sentence": corrected_sentence,
-            "corrections": corrections,
+            "corrected_sentence": render_tokens(choices, spaces, starts_with_number=bool(like_num) and like_num[0]),
+            "corrections": self._corrections(words, choices),
+            "fast_path_tokens": fast_path_tokens,
         }
+
+
+def render_tokens(words: List[str], spaces: List[str], starts_with_number: bool = False) -> str:
+    """
+    Join words with their trailing whitespace.
+
+    Heuristic reorder: move trailing "installation" to the front and insert "af"
+    when the sentence starts with a number (e.g., "2 lampe ... installation").
+    """
+    moved = None
+    if starts_with_number:
+        moved = next((i for i, word in enumerate(words) if word.lower() == "installation"), None)
+    if not moved:
+        return "".join([word + ws for word, ws in zip(words, spaces)])
+
+    # Ensure we leave a space after moving installation to the front
+    head = words[moved] + (spaces[moved] or " ")
+    if words[0].lower() != "af":
+        head += "af "
+    return head + "".join([word + ws for i, (word, ws) in enumerate(zip(words, spaces)) if i != moved])
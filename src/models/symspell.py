@@ -0,0 +1,237 @@
+"""
+Symmetric-delete candidate index for fast fuzzy vocabulary lookups.
+
+Replaces linear `difflib.get_close_matches` scans over the whole vocabulary. Words are indexed
+by every variant of their prefix with up to `max_distance` characters deleted; a lookup only
+ranks the handful of words that share a delete variant with the query, using the same
+SequenceMatcher ratio as difflib so cutoffs keep their meaning. Ties are broken by corpus
+frequency.
+
+The index only reaches words within `max_distance` deletions of the query on the first
+`prefix_length` characters. Typos beyond that (several edits, or a truncated word) may have a
+better match the index cannot see. So when the index finds nothing, or its best match is below
+`scan_below`, the words of compatible length are scanned as well, capped at `max_scan` words;
+the scan only ranks words that can beat the index's match.
+
+A match the index finds at or above `scan_below` is returned without the scan, and a word the
+index cannot reach may still beat it. That is the accepted regression: it only happens for
+queries several edits away from every word, and the returned match is then at least
+`scan_below` similar. tests/test_symspell.py bounds it on a committed sample of queries with
+their difflib answers.
+
+Parity check against difflib, and regenerating the test sample:
+    python -m src.models.symspell --corpus data/lm/lm_corpus.txt --sample 2000
+    python -m src.models.symspell --sample 300 --write-sample tests/data/symspell_parity.tsv
+"""
+
+import argparse
+import difflib
+import random
+from collections import Counter
+from itertools import combinations
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+
+class SymSpellIndex:
+    def __init__(
+        self,
+        words: Mapping[str, int],
+        max_distance: int = 2,
+        prefix_length: int = 7,
+        max_scan: int = 50000,
+        scan_below: float = 0.8,
+    ):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.max_scan = max_scan
+        self.scan_below = scan_below
+        self.freq: Dict[str, int] = {}
+        self.deletes: Dict[str, List[str]] = {}
+        # length -> words, for the fallback scan
+        self.by_length: Dict[int, List[str]] = {}
+        for word, count in words.items():
+            self.add(word, count)
+
+    def _variants(self, term: str) -> Set[str]:
+        """All strings reachable from the prefix of `term` by deleting up to max_distance chars."""
+        prefix = term[: self.prefix_length]
+        variants = {prefix}
+        for dist in range(1, min(self.max_distance, len(prefix)) + 1):
+            for drop in combinations(range(len(prefix)), dist):
+                variants.add("".join(ch for i, ch in enumerate(prefix) if i not in drop))
+        return variants
+
+    def add(self, word: str, count: int = 1) -> None:
+        """Add `word` (or bump its frequency) without rebuilding the index."""
+        if word in self.freq:
+            self.freq[word] += count
+            return
+        self.freq[word] = count
+        self.by_length.setdefault(len(word), []).append(word)
+        for variant in self._variants(word):
+            self.deletes.setdefault(variant, []).append(word)
+
+    def candidates(self, term: str) -> Set[str]:
+        found: Set[str] = set()
+        for variant in self._variants(term):
+            found.update(self.deletes.get(variant, ()))
+        return found
+
+    def _scan_candidates(self, term: str, cutoff: float) -> List[str]:
+        """Words whose length allows a ratio >= cutoff, closest lengths first, at most max_scan."""
+        if cutoff <= 0:
+            lengths = sorted(self.by_length, key=lambda length: abs(length - len(term)))
+        else:
+            low = len(term) * cutoff / (2 - cutoff) - 1e-9
+            high = len(term) * (2 - cutoff) / cutoff + 1e-9
+            lengths = sorted((l for l in self.by_length if low <= l <= high), key=lambda l: abs(l - len(term)))
+        words: List[str] = []
+        for length in lengths:
+            words.extend(self.by_length[length][: self.max_scan - len(words)])
+            if len(words) >= self.max_scan:
+                break
+        return words
+
+    def lookup(self, term: str, cutoff: float = 0.6, n: int = 1) -> List[str]:
+        """Return up to `n` words with a difflib ratio >= cutoff, best ratio (then frequency) first."""
+        scored = self._rank(term, self.candidates(term), cutoff, n)
+        if self.max_scan and (len(scored) < n or scored[-1][0] < self.scan_below):
+            # Too many edits for the delete variants to meet, or a weak match that a word
+            # further away may beat: scan for words that can do better
+            floor = scored[-1][0] if len(scored) >= n else cutoff
+            seen = {word for _, _, word in scored}
+            extra = [word for word in self._scan_candidates(term, floor) if word not in seen]
+            scored = sorted(scored + self._rank(term, extra, floor, n), reverse=True)[:n]
+        return [word for _, _, word in scored]
+
+    def _rank(self, term: str, words: Iterable[str], cutoff: float, n: int) -> List[Tuple[float, int, str]]:
+        """Up to `n` (ratio, frequency, word) with ratio >= cutoff, best first."""
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(term)
+        bounded = []
+        for word in words:
+            matcher.set_seq1(word)
+            if matcher.real_quick_ratio() < cutoff:
+                continue
+            bound = matcher.quick_ratio()
+            if bound >= cutoff:
+                bounded.append((bound, word))
+        # quick_ratio is an upper bound on ratio, so the exact (slow) ratio is only computed
+        # until no remaining candidate can beat the n-th best match.
+        bounded.sort(reverse=True)
+        scored = []
+        for bound, word in bounded:
+            if len(scored) >= n and bound < scored[n - 1][0]:
+                break
+            matcher.set_seq1(word)
+            ratio = matcher.ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, self.freq[word], word))
+                scored.sort(reverse=True)
+        return scored[:n]
+
+
+def _corrupt(word: str, rng: random.Random) -> str:
+    """Inject a single typo: deletion, duplication, substitution or transposition."""
+    i = rng.randrange(len(word))
+    op = rng.choice(("delete", "double", "swap", "sub"))
+    if op == "delete" and len(word) > 1:
+        return word[:i] + word[i + 1 :]
+    if op == "double":
+        return word[:i] + word[i] + word[i:]
+    if op == "swap" and i < len(word) - 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+    return word[:i] + rng.choice("abcdefghijklmnopqrstuvwxyzæøå") + word[i + 1 :]
+
+
+def _corrupt_many(word: str, rng: random.Random, edits: int = 3) -> str:
+    for _ in range(edits):
+        word = _corrupt(word, rng)
+    return word
+
+
+def _truncate(word: str, rng: random.Random) -> str:
+    """Cut the end off a word, as in abbreviated work-order notes."""
+    return word[: max(2, len(word) - rng.randint(2, 4))]
+
+
+QUERY_KINDS = {"single_edit": _corrupt, "three_edits": _corrupt_many, "truncated": _truncate}
+
+
+def corpus_vocab(path: str) -> Counter:
+    """Lowercased token frequencies of a corpus file, as the parity check and its test use them."""
+    vocab: Counter = Counter()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            vocab.update(token.lower() for token in line.split())
+    return vocab
+
+
+def difflib_baseline(vocab: Mapping[str, int], query: str, cutoffs=(0.8, 0.6)) -> List[str]:
+    """The two-pass difflib strategy SpellChecker.suggest used before the index."""
+    for cutoff in cutoffs:
+        expected = difflib.get_close_matches(query, vocab, n=1, cutoff=cutoff)
+        if expected:
+            return expected
+    return []
+
+
+def parity_report(
+    vocab: Mapping[str, int], queries: Iterable[str], cutoffs=(0.8, 0.6), index: Optional["SymSpellIndex"] = None
+) -> Dict[str, float]:
+    """Compare index suggestions with the two-pass difflib strategy used by SpellChecker.suggest."""
+    index = index or SymSpellIndex(vocab)
+    total = same = worse = index_only = difflib_only = 0
+    for query in queries:
+        expected = difflib_baseline(vocab, query, cutoffs)
+        got = index.lookup(query, cutoff=min(cutoffs), n=1)
+        total += 1
+        if expected == got or (expected and got and _ratio(query, got[0]) >= _ratio(query, expected[0])):
+            same += 1
+        elif expected and got:
+            worse += 1
+        elif got and not expected:
+            index_only += 1
+        elif expected and not got:
+            difflib_only += 1
+    return {
+        "queries": total,
+        "same_or_better": same / max(total, 1),
+        "worse": worse,
+        "index_only": index_only,
+        "difflib_only": difflib_only,
+    }
+
+
+def _ratio(query: str, word: str) -> float:
+    # ratio() is not symmetric; score like get_close_matches and lookup (the word is seq1)
+    return difflib.SequenceMatcher(None, word, query).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check SymSpellIndex suggestions against difflib")
+    parser.add_argument("--corpus", default="data/lm/lm_corpus.txt")
+    parser.add_argument("--sample", type=int, default=2000, help="Number of corrupted tokens to test")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--write-sample", help="Write kind<TAB>query<TAB>difflib answer here instead of reporting")
+    args = parser.parse_args()
+
+    vocab = corpus_vocab(args.corpus)
+    rng = random.Random(args.seed)
+    words = [w for w in vocab if w.isalpha() and len(w) > 3]
+    sample = rng.sample(words, min(args.sample, len(words)))
+    index = SymSpellIndex(vocab)
+    rows = []
+    for kind, corrupt in QUERY_KINDS.items():
+        queries = [q for q in (corrupt(w, rng) for w in sample) if q not in vocab]
+        if args.write_sample:
+            rows.extend(f"{kind}\t{q}\t{''.join(difflib_baseline(vocab, q))}\n" for q in queries)
+        else:
+            print(kind, parity_report(vocab, queries, index=index))
+    if args.write_sample:
+        with open(args.write_sample, "w", encoding="utf-8") as f:
+            f.writelines(rows)
+        print(f"{len(rows)} queries written to {args.write_sample}")
+
+if __name__ == "__main__":
+    main()
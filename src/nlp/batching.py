@@ -0,0 +1,117 @@
+"""
+Length-aware batching for the spaCy pipeline.
+
+`nlp.pipe` batches a fixed number of texts, and the transformer pads every text in a batch to the
+longest one. Work orders range from three words to run-on lines of several hundred, so one long
+line makes its whole batch expensive, and a very long line on its own costs memory roughly in
+proportion to its length.
+
+`pipe_by_length` reads the input in windows and splits lines longer than `max_item_tokens` at the
+safest boundary it can find: sentence punctuation first, then a comma, then plain whitespace. It
+sorts the pieces by length and cuts batches so that items x longest item stays under
+`max_batch_tokens`. Pieces of one line are merged back into one result, and results are yielded in
+input order. Lengths are whitespace-separated words, which is a cheap proxy for what the tokenizer
+and transformer will see.
+
+src.nlp.spacy_pipeline.parse_many (the API batch path and train_pdg) and
+src.training.extract_lemmas batch through this module.
+"""
+
+import re
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+_WORD = re.compile(r"\S+")
+# Boundaries to cut an overlong line at, strongest first: the last character of a word
+_BOUNDARIES = (".!?;:", ",")
+
+
+def text_length(text: str) -> int:
+    return len(_WORD.findall(text))
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Split `text` into pieces of at most `max_tokens` words; "".join(pieces) == text.
+    Whitespace after a cut stays with the piece before it.
+    """
+    words = list(_WORD.finditer(text))
+    if max_tokens <= 0 or len(words) <= max_tokens:
+        return [text]
+    cuts = []
+    start = 0
+    while len(words) - start > max_tokens:
+        end = start + max_tokens
+        cut = end
+        # Never cut before half the budget; a boundary that early leaves a tiny piece behind
+        floor = start + max(max_tokens // 2, 1)
+        for marks in _BOUNDARIES:
+            found = next((j + 1 for j in range(end - 1, floor - 1, -1) if words[j].group()[-1] in marks), None)
+            if found is not None:
+                cut = found
+                break
+        cuts.append(words[cut].start())
+        start = cut
+    bounds = [0, *cuts, len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def length_batches(lengths: Sequence[int], max_tokens: int, max_items: int) -> List[List[int]]:
+    """
+    Group indices into batches of similar length. Items are taken shortest first, and a batch is
+    closed when adding the next item would make items x longest exceed `max_tokens` or the batch
+    would hold more than `max_items`. A single item over `max_tokens` gets a batch of its own.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for i in order:
+        longest = max(lengths[i], 1)
+        if current and ((len(current) + 1) * longest > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def pipe_by_length(
+    texts: Iterable[str],
+    pipe: Callable[[List[str]], Iterable[T]],
+    merge: Callable[[List[T]], T],
+    max_batch_tokens: int = 4096,
+    max_batch_items: int = 64,
+    max_item_tokens: int = 150,
+    window: int = 1024,
+) -> Iterator[T]:
+    """
+    Yield pipe's result for every text, in input order.
+
+    `pipe` is called once per batch with the batch's texts and must return one result per text;
+    `merge` combines the results of the pieces of a split text. At most `window` texts are held
+    in memory, so the input may be a stream.
+    """
+    it = iter(texts)
+    while True:
+        chunk = list(islice(it, window))
+        if not chunk:
+            return
+        pieces: List[str] = []
+        owners: List[int] = []
+        for i, text in enumerate(chunk):
+            for piece in split_text(text, max_item_tokens):
+                pieces.append(piece)
+                owners.append(i)
+        results: List[Optional[T]] = [None] * len(pieces)
+        for batch in length_batches([text_length(p) for p in pieces], max_batch_tokens, max_batch_items):
+            for j, result in zip(batch, pipe([pieces[j] for j in batch])):
+                results[j] = result
+
+        grouped: List[List[T]] = [[] for _ in chunk]
+        for owner, result in zip(owners, results):
+            grouped[owner].append(result)
+        for parts in grouped:
+            yield parts[0] if len(parts) == 1 else merge(parts)
@@ -0,0 +1,178 @@
+"""
+Persistent cache of serialized parses, keyed by text hash and pipeline version.
+
+Two tiers: an in-memory LRU of serialized Docs on top of a SQLite file. Rows are keyed by the
+pipeline version that produced them (backbone, model package and version, active components,
+spaCy version) and the text hash, so a model change never serves old parses, and several
+pipelines (e.g. the API and train_pdg) can share one file. The file is capped at
+`max_disk_bytes`; when it grows past the cap the least recently used rows are deleted, which
+drops the parses of versions nobody reads any more first. The total size is kept in a one-row
+table by triggers, so every process sharing the file sees the same figure.
+
+The cache stores bytes and knows nothing about spaCy; `src.nlp.spacy_pipeline` serializes Docs
+without the transformer tensor and rebuilds them on the shared vocab.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.models.cache import LRUCache
+
+# Bump when the layout changes; an older cache file is dropped and rebuilt
+SCHEMA_VERSION = 2
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS parses (
+        version TEXT NOT NULL,
+        key BLOB NOT NULL,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        used REAL NOT NULL,
+        PRIMARY KEY (version, key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS parses_used ON parses (used)",
+    "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO totals VALUES (0, 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS parses_insert AFTER INSERT ON parses
+    BEGIN UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parses_delete AFTER DELETE ON parses
+    BEGIN UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END
+    """,
+]
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class ParseCache:
+    def __init__(
+        self,
+        path: Optional[str],
+        version: str,
+        memory_items: int = 4096,
+        memory_bytes: Optional[int] = 64 * 1024 * 1024,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ):
+        self.path = path
+        self.version = version
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = LRUCache(max_items=memory_items, max_bytes=memory_bytes)
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            # Rows replaced by INSERT OR REPLACE only fire the delete trigger with this on
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    for table in ("parses", "totals"):
+                        self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+                    self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+                for statement in _SCHEMA:
+                    self._conn.execute(statement)
+
+    @property
+    def _disk_bytes(self) -> int:
+        if self._conn is None:
+            return 0
+        return self._conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[bytes]]:
+        """Serialized parses for `texts` (None where missing), promoting disk hits to memory."""
+        keys = [text_key(text) for text in texts]
+        found: List[Optional[bytes]] = [self.memory.get(key) for key in keys]
+        missing = [i for i, data in enumerate(found) if data is None]
+        if not missing or self._conn is None:
+            return found
+        wanted = {keys[i] for i in missing}
+        with self._lock:
+            rows = []
+            wanted_list = list(wanted)
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(wanted_list), 500):
+                chunk = wanted_list[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows.extend(
+                    self._conn.execute(
+                        f"SELECT key, data FROM parses WHERE version = ? AND key IN ({marks})", (self.version, *chunk)
+                    ).fetchall()
+                )
+            if rows:
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE parses SET used = ? WHERE version = ? AND key = ?",
+                        [(now, self.version, key) for key, _ in rows],
+                    )
+        by_key = dict(rows)
+        for i in missing:
+            data = by_key.get(keys[i])
+            if data is not None:
+                found[i] = data
+                self.disk_hits += 1
+                self.memory.put(keys[i], data)
+        return found
+
+    def get(self, text: str) -> Optional[bytes]:
+        return self.get_many([text])[0]
+
+    def put_many(self, items: Sequence[Tuple[str, bytes]]) -> None:
+        rows = {}
+        now = time.time()
+        for text, data in items:
+            key = text_key(text)
+            self.memory.put(key, data)
+            rows[key] = (self.version, key, data, len(data), now)
+        rows = list(rows.values())
+        if self._conn is None or not rows:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO parses VALUES (?, ?, ?, ?, ?)", rows)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def put(self, text: str, data: bytes) -> None:
+        self.put_many([(text, data)])
+
+    def _evict(self) -> None:
+        target = int(self.max_disk_bytes * 0.9)
+        excess = self._disk_bytes - target
+        while excess > 0:
+            rows = self._conn.execute("SELECT version, key, size FROM parses ORDER BY used LIMIT 1000").fetchall()
+            if not rows:
+                break
+            dropped = []
+            for version, key, size in rows:
+                dropped.append((version, key))
+                excess -= size
+                if excess <= 0:
+                    break
+            with self._conn:
+                self._conn.executemany("DELETE FROM parses WHERE version = ? AND key = ?", dropped)
+            self.disk_evictions += len(dropped)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.memory.stats()
+        with self._lock:
+            disk_bytes = self._disk_bytes
+        stats.update({"disk_hits": self.disk_hits, "disk_bytes": disk_bytes, "disk_evictions": self.disk_evictions})
+        return stats
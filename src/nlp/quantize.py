@@ -0,0 +1,126 @@
+"""
+Int8 CPU inference for the transformer inside the spaCy/DaCy pipeline.
+
+`quantize_pipeline(nlp)` applies PyTorch dynamic int8 quantization to the Linear layers of every
+PyTorch model wrapped by the pipeline (the transformer that tagging and parsing listen to). The
+pipeline object is unchanged, so `nlp(text)`, `nlp.pipe` and the Doc attributes work as
+before. `set_threads` sets the intra-op and inter-op thread pools used by the quantized kernels.
+
+Enable it for the shared pipeline with STDTEXT_NLP_QUANTIZE=1 (see src/nlp/spacy_pipeline.py).
+
+Parity and throughput against the full-precision pipeline:
+    python -m src.nlp.quantize --backbone small --sample 500 --threads 4
+"""
+
+import argparse
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+def _torch_shims(nlp) -> Iterator[Tuple[object, object]]:
+    """(shim, torch module) for every PyTorch model wrapped by thinc inside the pipeline."""
+    import torch
+
+    seen = set()
+    for _, component in nlp.pipeline:
+        model = getattr(component, "model", None)
+        if model is None:
+            continue
+        for node in model.walk():
+            for shim in node.shims:
+                module = getattr(shim, "_model", None)
+                if isinstance(module, torch.nn.Module) and id(shim) not in seen:
+                    seen.add(id(shim))
+                    yield shim, module
+
+
+def set_threads(intra_op: Optional[int] = None, inter_op: Optional[int] = None) -> None:
+    import torch
+
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_interop_threads(inter_op)
+        except RuntimeError:
+            pass  # only settable before the first parallel region runs; keep the current pool
+
+
+def quantize_pipeline(nlp) -> int:
+    """Quantize the wrapped PyTorch models in place; returns how many were quantized."""
+    import torch
+
+    count = 0
+    for shim, module in _torch_shims(nlp):
+        module.eval()
+        shim._model = torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+        # Half precision autocast and int8 kernels do not mix
+        if hasattr(shim, "_mixed_precision"):
+            shim._mixed_precision = False
+        count += 1
+    return count
+
+
+def _annotations(nlp, texts: List[str], batch_size: int) -> Tuple[List[list], float]:
+    start = time.perf_counter()
+    docs = [[(tok.pos_, tok.dep_, tok.head.i) for tok in doc] for doc in nlp.pipe(texts, batch_size=batch_size)]
+    return docs, time.perf_counter() - start
+
+
+def parity_report(reference, candidate, texts: List[str], batch_size: int = 32) -> Dict[str, float]:
+    """POS and dependency agreement of `candidate` with `reference`, plus throughput of both."""
+    # Warm up both pipelines so lazy initialisation is not timed
+    list(reference.pipe(texts[:8]))
+    list(candidate.pipe(texts[:8]))
+    ref_docs, ref_seconds = _annotations(reference, texts, batch_size)
+    cand_docs, cand_seconds = _annotations(candidate, texts, batch_size)
+
+    tokens = pos_same = dep_same = head_same = 0
+    for ref, cand in zip(ref_docs, cand_docs):
+        for (r_pos, r_dep, r_head), (c_pos, c_dep, c_head) in zip(ref, cand):
+            tokens += 1
+            pos_same += r_pos == c_pos
+            dep_same += r_dep == c_dep
+            head_same += r_dep == c_dep and r_head == c_head
+    return {
+        "sentences": len(texts),
+        "tokens": tokens,
+        "pos_agreement": pos_same / max(tokens, 1),
+        "dep_label_agreement": dep_same / max(tokens, 1),
+        "labeled_attachment_agreement": head_same / max(tokens, 1),
+        "reference_sentences_per_s": len(texts) / ref_seconds if ref_seconds else 0.0,
+        "quantized_sentences_per_s": len(texts) / cand_seconds if cand_seconds else 0.0,
+        "speedup": ref_seconds / cand_seconds if cand_seconds else 0.0,
+    }
+
+
+def main():
+    from src.nlp import spacy_pipeline
+
+    parser = argparse.ArgumentParser(description="Compare the int8 pipeline with the full-precision one")
+    parser.add_argument("--backbone", default="small")
+    parser.add_argument("--corpus", default="data/lm/lm_corpus.txt")
+    parser.add_argument("--sample", type=int, default=500, help="Number of corpus lines to parse")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for both pipelines")
+    parser.add_argument("--interop-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    set_threads(args.threads, args.interop_threads)
+    spacy_pipeline.configure(backbone=args.backbone, quantize=False)
+    reference = spacy_pipeline._load()
+    candidate = spacy_pipeline._load()
+    quantized = quantize_pipeline(candidate)
+    if not quantized:
+        print(f"{args.backbone} wraps no PyTorch model; nothing to quantize")
+        return
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        texts = [line.strip() for line, _ in zip(f, range(args.sample)) if line.strip()]
+    report = parity_report(reference, candidate, texts, batch_size=args.batch_size)
+    report["quantized_models"] = quantized
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,307 @@
-import dacy
+"""
+Shared spaCy pipeline, loaded lazily on first use.
+
+The backbone is chosen with `configure()` or the STDTEXT_NLP_BACKBONE environment variable:
+- DaCy sizes ("small", "medium", "large") load the transformer pipeline through dacy.load.
+- Anything else is passed to spacy.load, e.g. "da_core_news_sm" for a CPU pipeline that trades
+  some accuracy for several times the throughput.
+
+On CPU-only hosts, STDTEXT_NLP_QUANTIZE=1 runs the transformer with int8 dynamic quantization
+(src/nlp/quantize.py); STDTEXT_TORCH_THREADS and STDTEXT_TORCH_INTEROP_THREADS size the intra-op
+and inter-op thread pools.
+
+Nothing in the project reads entities, so NER is excluded unless `fine_grained_ner=True`.
+Callers that only need tokens and lexical attributes (text, whitespace, like_num) should use
+`tokenize()`, which runs the tokenizer alone.
+
+`parse`/`parse_many` can sit behind a persistent parse cache (src/nlp/parse_cache.py): set
+STDTEXT_PARSE_CACHE to a file path, or pass `parse_cache=` to `configure()`. Cached parses are
+tied to the pipeline version and skip the transformer entirely.
+
+`parse_many` batches by length rather than by count (src/nlp/batching.py): a batch holds at most
+STDTEXT_MAX_BATCH_TOKENS words including padding, and lines longer than STDTEXT_MAX_ITEM_TOKENS
+words are parsed in pieces and merged back into one Doc. `parse` splits overlong lines the same way.
+
+Compare modes:
+    python -m src.nlp.spacy_pipeline --backbone small --sample 200
+    python -m src.nlp.spacy_pipeline --backbone da_core_news_sm --sample 200
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from src.models.metrics import metrics
+from src.nlp.batching import pipe_by_length, split_text
+from src.nlp.parse_cache import ParseCache
+
+DACY_SIZES = {"small", "medium", "large"}
+FINE_GRAINED_NER = "da_dacy_small_ner_fine_grained-0.1.0"
+
+_config = {
+    "backbone": os.environ.get("STDTEXT_NLP_BACKBONE", "small"),
+    "fine_grained_ner": False,
+    "parse_cache": os.environ.get("STDTEXT_PARSE_CACHE") or None,
+    "parse_cache_mb": int(os.environ.get("STDTEXT_PARSE_CACHE_MB", "1024")),
+    "quantize": os.environ.get("STDTEXT_NLP_QUANTIZE", "0") == "1",
+    "intra_op_threads": int(os.environ.get("STDTEXT_TORCH_THREADS", "0")) or None,
+    "inter_op_threads": int(os.environ.get("STDTEXT_TORCH_INTEROP_THREADS", "0")) or None,
+    "max_batch_tokens": int(os.environ.get("STDTEXT_MAX_BATCH_TOKENS", "4096")),
+    "max_item_tokens": int(os.environ.get("STDTEXT_MAX_ITEM_TOKENS", "150")),
+}
+# Texts looked up in the parse cache at once by parse_many
+_CACHE_CHUNK = 256
+_nlp = None
+_cache: Optional[ParseCache] = None
+_lock = threading.Lock()
+_stats = {"load_seconds": None, "docs": 0, "parse_seconds": 0.0}
+
+
+def configure(
+    backbone: Optional[str] = None,
+    fine_grained_ner: Optional[bool] = None,
+    parse_cache: Optional[str] = None,
+    parse_cache_mb: Optional[int] = None,
+    quantize: Optional[bool] = None,
+    intra_op_threads: Optional[int] = None,
+    inter_op_threads: Optional[int] = None,
+    max_batch_tokens: Optional[int] = None,
+    max_item_tokens: Optional[int] = None,
+) -> None:
+    """Select the pipeline; a pipeline that is already loaded is dropped and reloaded on next use."""
+    global _nlp, _cache
+    with _lock:
+        if backbone is not None:
+            _config["backbone"] = backbone
+        if fine_grained_ner is not None:
+            _config["fine_grained_ner"] = fine_grained_ner
+        if parse_cache is not None:
+            _config["parse_cache"] = parse_cache or None
+        if parse_cache_mb is not None:
+            _config["parse_cache_mb"] = parse_cache_mb
+        if quantize is not None:
+            _config["quantize"] = quantize
+        if intra_op_threads is not None:
+            _config["intra_op_threads"] = intra_op_threads
+        if inter_op_threads is not None:
+            _config["inter_op_threads"] = inter_op_threads
+        if max_batch_tokens is not None:
+            _config["max_batch_tokens"] = max_batch_tokens
+        if max_item_tokens is not None:
+            _config["max_item_tokens"] = max_item_tokens
+        _nlp = None
+        if _cache is not None:
+            _cache.close()
+        _cache = None
+        _stats.update({"load_seconds": None, "docs": 0, "parse_seconds": 0.0})
+
+
+def _load():
+    backbone = _config["backbone"]
+    exclude = [] if _config["fine_grained_ner"] else ["ner"]
+    if backbone in DACY_SIZES:
+        import dacy
+
+        nlp = dacy.load(backbone, exclude=exclude)
+        if _config["fine_grained_ner"]:
+            nlp.add_pipe(FINE_GRAINED_NER, config={"size": "small"})
+        return nlp
+
+    import spacy
+
+    return spacy.load(backbone, exclude=exclude)
+
+
+def get_nlp():
+    """Return the shared pipeline, loading it on first call."""
+    global _nlp, _cache
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:
+                start = time.perf_counter()
+                nlp = _load()
+                if _config["quantize"] or _config["intra_op_threads"] or _config["inter_op_threads"]:
+                    from src.nlp.quantize import quantize_pipeline, set_threads
+
+                    set_threads(_config["intra_op_threads"], _config["inter_op_threads"])
+                    if _config["quantize"]:
+                        quantize_pipeline(nlp)
+                if _config["parse_cache"]:
+                    _cache = ParseCache(
+                        _config["parse_cache"],
+                        pipeline_version(nlp),
+                        max_disk_bytes=_config["parse_cache_mb"] * 1024 * 1024,
+                    )
+                _nlp = nlp
+                _stats["load_seconds"] = time.perf_counter() - start
+    return _nlp
+
+
+def pipeline_version(nlp) -> str:
+    """
+    Identifies everything that can change a parse: model package, components, spaCy itself, and
+    the length at which long lines are split and merged back (see `parse`).
+    """
+    import spacy
+
+    meta = nlp.meta
+    parts = [
+        _config["backbone"],
+        f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}",
+        ",".join(nlp.pipe_names),
+        spacy.__version__,
+        "int8" if _config["quantize"] else "fp32",
+        f"split{_config['max_item_tokens']}",
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _to_bytes(doc) -> bytes:
+    # The transformer output is by far the largest part of a Doc and nothing downstream reads it
+    return doc.to_bytes(exclude=["tensor", "user_data"])
+
+
+def _from_bytes(nlp, data: bytes):
+    from spacy.tokens import Doc
+
+    return Doc(nlp.vocab).from_bytes(data)
+
+
+def merge_docs(docs):
+    """One Doc from the parsed pieces of a split line; each piece keeps its own sentence roots."""
+    from spacy.tokens import Doc
+
+    # The pieces carry the original whitespace, so the merged text equals the input line
+    return Doc.from_docs(docs, ensure_whitespace=False)
+
+
+def __getattr__(name):
+    # Keep `from src.nlp.spacy_pipeline import nlp` working without loading at import time
+    if name == "nlp":
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-nlp = dacy.load("small")
-nlp.add_pipe("da_dacy_small_ner_fine_grained-0.1.0", config={"size": "small"})
 
 def parse(text: str):
-    return nlp(text)
+    nlp = get_nlp()
+    if _cache is not None:
+        data = _cache.get(text)
+        if data is not None:
+            return _from_bytes(nlp, data)
+    start = time.perf_counter()
+    pieces = split_text(text, _config["max_item_tokens"])
+    doc = nlp(text) if len(pieces) == 1 else merge_docs(list(nlp.pipe(pieces, batch_size=len(pieces))))
+    elapsed = time.perf_counter() - start
+    _stats["parse_seconds"] += elapsed
+    _stats["docs"] += 1
+    metrics.observe("parse", elapsed)
+    if _cache is not None:
+        _cache.put(text, _to_bytes(doc))
+    return doc
+
+
+def parse_many(texts, batch_size: int = 32):
+    """Parse texts in length-bucketed batches of at most `batch_size` items; yields Docs in input order."""
+    nlp = get_nlp()
+    if _cache is None:
+        yield from _pipe(nlp, texts, batch_size)
+        return
+    chunk: List[str] = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) >= _CACHE_CHUNK:
+            yield from _parse_chunk_cached(nlp, chunk, batch_size)
+            chunk = []
+    if chunk:
+        yield from _parse_chunk_cached(nlp, chunk, batch_size)
+
+
+def _parse_chunk_cached(nlp, texts: List[str], batch_size: int) -> Iterator:
+    cached = _cache.get_many(texts)
+    misses = [text for text, data in zip(texts, cached) if data is None]
+    parsed = list(_pipe(nlp, misses, batch_size)) if misses else []
+    if parsed:
+        _cache.put_many([(text, _to_bytes(doc)) for text, doc in zip(misses, parsed)])
+    fresh = iter(parsed)
+    for data in cached:
+        yield _from_bytes(nlp, data) if data is not None else next(fresh)
+
+
+def pipe_docs(texts, batch_size: int = 32, disable: Optional[List[str]] = None) -> Iterator:
+    """Like parse_many without the parse cache; `disable` names components to skip."""
+    return _pipe(get_nlp(), texts, batch_size, disable)
+
+
+def _pipe(nlp, texts, batch_size: int, disable: Optional[List[str]] = None) -> Iterator:
+    def run(batch: List[str]) -> list:
+        start = time.perf_counter()
+        docs = list(nlp.pipe(batch, batch_size=len(batch), disable=disable or []))
+        elapsed = time.perf_counter() - start
+        _stats["parse_seconds"] += elapsed
+        for _ in docs:
+            metrics.observe("parse", elapsed / len(docs))
+        return docs
+
+    for doc in pipe_by_length(
+        texts,
+        run,
+        merge_docs,
+        max_batch_tokens=_config["max_batch_tokens"],
+        max_batch_items=batch_size,
+        max_item_tokens=_config["max_item_tokens"],
+    ):
+        _stats["docs"] += 1
+        yield doc
+
+
+def tokenize(text: str):
+    """Tokenizer-only Doc: text, whitespace and lexical attributes such as like_num."""
+    return get_nlp().make_doc(text)
+
+
+def parse_cache_stats() -> Optional[Dict[str, int]]:
+    return _cache.stats() if _cache is not None else None
+
+
+def pipeline_stats() -> Dict[str, object]:
+    """Backbone, active components, load time and mean parse latency so far."""
+    docs = _stats["docs"]
+    return {
+        "backbone": _config["backbone"],
+        "quantized": _config["quantize"],
+        "components": list(_nlp.pipe_names) if _nlp is not None else None,
+        "load_seconds": _stats["load_seconds"],
+        "docs_parsed": docs,
+        "mean_parse_ms": (_stats["parse_seconds"] / docs * 1000) if docs else None,
+        "parse_cache": parse_cache_stats(),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report load time and per-sentence latency of a backbone")
+    parser.add_argument("--backbone", default=_config["backbone"])
+    parser.add_argument("--quantize", action="store_true", help="Run the transformer with int8 weights")
+    parser.add_argument("--corpus", default="data/lm/lm_corpus.txt")
+    parser.add_argument("--sample", type=int, default=200, help="Number of corpus lines to parse")
+    args = parser.parse_args()
+
+    configure(backbone=args.backbone, quantize=args.quantize or None)
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line, _ in zip(f, range(args.sample)) if line.strip()]
+
+    start = time.perf_counter()
+    parse(lines[0])
+    first_request = time.perf_counter() - start
+    for line in lines[1:]:
+        parse(line)
+    stats = pipeline_stats()
+    stats["time_to_first_request_s"] = first_request
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Compile the spellchecker vocabulary and lemma lookups into one binary artifact.
+
+Usage:
+    python -m src.training.compile_lexicon --corpus data/lm/lm_corpus.txt --lemmas data/lm/lemmas.json --output data/lm/lexicon.bin
+
+The artifact stores vocabulary frequencies, the variant -> canonical map and the lemma
+categories. SpellChecker loads it in place of the text files as long as the sources it was
+built from are unchanged; rerun this after retraining the corpus or extracting lemmas.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ensure project root on sys.path so `python src/training/compile_lexicon.py` works
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.models.lexicon import load_lexicon, load_text_lexicon, save_lexicon, source_fingerprint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile vocabulary and lemmas into a binary lexicon")
+    parser.add_argument("--corpus", default="data/lm/lm_corpus.txt", help="Cleaned domain corpus")
+    parser.add_argument("--lemmas", default="data/lm/lemmas.json", help="Lemma variants JSON")
+    parser.add_argument("--output", default="data/lm/lexicon.bin", help="Where to write the artifact")
+    args = parser.parse_args()
+
+    corpus_path = Path(args.corpus)
+    if not corpus_path.exists():
+        raise FileNotFoundError(f"Corpus not found: {corpus_path}")
+
+    lexicon = load_text_lexicon(corpus_path, args.lemmas)
+    fingerprint = source_fingerprint(corpus_path, args.lemmas)
+    out_path = Path(args.output)
+    save_lexicon(lexicon, out_path, fingerprint)
+
+    start = time.perf_counter()
+    load_lexicon(out_path, fingerprint)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"Wrote {len(lexicon.vocab)} words and {len(lexicon.variant_to_canonical)} variants to {out_path} (loads in {elapsed_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
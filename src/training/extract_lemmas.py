@@ -5,33 +5,115 @@ Usage:
     python -m src.training.extract_lemmas --input data/lm/lm_corpus.txt --output data/lm/lemmas.json --top-k 300
 
 This preserves existing lemma entries (including objects) and adds missing verb lemmas under the "actions" key.
+
+The corpus is streamed through the length-bucketed batching of src.nlp.spacy_pipeline with only
+the tagging and lemmatization components enabled; --processes > 1 uses nlp.pipe's worker
+processes with fixed-size batches instead. With --state, verb counts and the byte offset reached
+are kept between runs, so a rerun only parses lines appended to the corpus since the previous run.
 """
 
 import argparse
+import hashlib
 import json
 import sys
 from collections import Counter
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 
 # Ensure project root on sys.path so `python src/api/main.py` works
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from src.nlp.spacy_pipeline import nlp
+from src.nlp.spacy_pipeline import get_nlp, pipe_docs
 
 
-def extract_action_lemmas(corpus_path: Path, top_k: int) -> List[str]:
-    """Return the most frequent verb lemmas from the corpus."""
+# Components that produce pos_ and lemma_ (plus the shared embedding layer they listen to)
+LEMMA_COMPONENTS = {"tok2vec", "transformer", "tagger", "morphologizer", "attribute_ruler", "lemmatizer", "trainable_lemmatizer"}
+_PREFIX_BYTES = 64 * 1024
+
+
+class _Cursor:
+    """Byte offset just past the last complete line handed out by read_lines."""
+
+    def __init__(self, offset: int = 0):
+        self.offset = offset
+
+
+def read_lines(corpus_path: Path, cursor: _Cursor, complete_only: bool = False) -> Iterator[str]:
+    """
+    Lazily yield non-empty lines starting at cursor.offset, advancing the cursor as we go.
+    With complete_only a trailing line without newline is left for the next incremental run.
+    """
+    with corpus_path.open("rb") as f:
+        f.seek(cursor.offset)
+        for raw in f:
+            if complete_only and not raw.endswith(b"\n"):
+                break
+            cursor.offset += len(raw)
+            line = raw.decode("utf-8").strip()
+            if line:
+                yield line
+
+
+def _corpus_prefix_hash(corpus_path: Path) -> str:
+    with corpus_path.open("rb") as f:
+        return hashlib.sha1(f.read(_PREFIX_BYTES)).hexdigest()
+
+
+def load_state(state_path: Optional[Path], corpus_path: Path) -> tuple:
+    """Return (counts, offset) from a previous run, or empty state if the corpus was rewritten."""
+    if not state_path or not state_path.exists():
+        return Counter(), 0
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return Counter(), 0
+    offset = state.get("offset", 0)
+    if offset > corpus_path.stat().st_size or state.get("prefix_sha1") != _corpus_prefix_hash(corpus_path):
+        return Counter(), 0
+    return Counter(state.get("counts", {})), offset
+
+
+def save_state(state_path: Path, corpus_path: Path, counts: Counter, offset: int) -> None:
+    state = {"offset": offset, "prefix_sha1": _corpus_prefix_hash(corpus_path), "counts": dict(counts)}
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = state_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(state_path)
+
+
+def count_verb_lemmas(lines, batch_size: int = 256, n_process: int = 1) -> Counter:
+    """Count verb lemmas over an iterable of lines; memory stays bounded by the batch size."""
+    nlp = get_nlp()
+    disable = [name for name in nlp.pipe_names if name not in LEMMA_COMPONENTS]
     counts: Counter[str] = Counter()
-    for line in corpus_path.read_text(encoding="utf-8").splitlines():
-        if not line.strip():
-            continue
-        for tok in nlp(line):
+    if n_process > 1:
+        docs = nlp.pipe(lines, batch_size=batch_size, n_process=n_process, disable=disable)
+    else:
+        docs = pipe_docs(lines, batch_size=batch_size, disable=disable)
+    for doc in docs:
+        for tok in doc:
             if tok.pos_ == "VERB":
                 lemma = tok.lemma_.lower()
                 counts[lemma] += 1
+    return counts
+
+
+def extract_action_lemmas(
+    corpus_path: Path,
+    top_k: int,
+    batch_size: int = 256,
+    n_process: int = 1,
+    state_path: Optional[Path] = None,
+) -> List[str]:
+    """Return the most frequent verb lemmas from the corpus."""
+    counts, offset = load_state(state_path, corpus_path)
+    cursor = _Cursor(offset)
+    lines = read_lines(corpus_path, cursor, complete_only=state_path is not None)
+    counts.update(count_verb_lemmas(lines, batch_size=batch_size, n_process=n_process))
+    if state_path:
+        save_state(state_path, corpus_path, counts, cursor.offset)
     return [lemma for lemma, _ in counts.most_common(top_k)]
 
 
@@ -61,6 +143,9 @@ def main():
     parser.add_argument("--input", required=True, help="Path to domain corpus (cleaned, e.g., data/lm/lm_corpus.txt)")
     parser.add_argument("--output", required=True, help="Path to lemmas.json to write/update")
     parser.add_argument("--top-k", type=int, default=300, help="How many verb lemmas to keep (by frequency)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Maximum lines per batch")
+    parser.add_argument("--processes", type=int, default=1, help="nlp.pipe worker processes")
+    parser.add_argument("--state", default=None, help="Keep counts here and only parse lines added since the last run")
     args = parser.parse_args()
 
     corpus_path = Path(args.input)
@@ -69,7 +154,13 @@ def main():
     if not corpus_path.exists():
         raise FileNotFoundError(f"Corpus not found: {corpus_path}")
 
-    lemmas = extract_action_lemmas(corpus_path, top_k=args.top_k)
+    lemmas = extract_action_lemmas(
+        corpus_path,
+        top_k=args.top_k,
+        batch_size=args.batch_size,
+        n_process=args.processes,
+        state_path=Path(args.state) if args.state else None,
+    )
     data = load_existing_lemmas(out_path)
     data = update_actions(data, lemmas)
 
@@ -1,5 +1,25 @@
+"""
+Prepare the domain LM corpus from the raw work-order dump.
+
+Usage:
+    python -m src.training.prepare_lm_courpus_domain --input data/raw/large_training_text.txt --output data/lm/lm_corpus.txt --processes 4
+
+The raw file is read in chunks of lines that are segmented and cleaned in worker processes;
+results are written in input order. Repeated segments are written once, and
+`<output>.counts.tsv` holds "segment<TAB>count" for every written segment (same order as the
+corpus) so trainers can weight segments instead of reprocessing duplicates. With
+--near-duplicates, segments that differ only in digits or punctuation count as duplicates of the
+first one seen.
+"""
+
+import argparse
+import hashlib
 import re
+from array import array
+from collections import deque
+from multiprocessing import Pool
 from pathlib import Path
+from typing import Iterator, List
 
 # -------------------------
 # PATTERNS
@@ -14,6 +34,13 @@ ADDRESS_TAG = re.compile(r"^VEDR\.", re.IGNORECASE)
 # Status/ending words typical in your domain
 STATUS_WORDS = {"afprøvet", "fundet i orden", "fundet iorden", "justeret"}
 
+SENTENCE_SPLIT = re.compile(r"\.\s*")
+# Literal "\n" sequences left over from the export
+LITERAL_NEWLINE = re.compile(r"\\ns*")
+# Near-duplicate key: digits collapse to one symbol, punctuation is dropped
+NEAR_DUP_DIGITS = re.compile(r"\d+")
+NEAR_DUP_PUNCT = re.compile(r"[^\w\s]")
+
 # -------------------------
 # HELPERS
 # -------------------------
@@ -25,10 +52,9 @@ def remove_work_orders(text: str) -> str:
 
 def clean_spaces(t: str) -> str:
     """Normalize spacing."""
-    t = t.strip()
-    t = re.sub(r"\s+", " ", t)
-    t = re.sub(r"\\ns*", "", t)
-    return t
+    if "\\" in t:
+        t = LITERAL_NEWLINE.sub("", t)
+    return " ".join(t.split())
 
 
 def normalize_case(t: str) -> str:
@@ -57,8 +83,8 @@ def segment_line(line: str):
     original = remove_work_orders(original)
 
     # Split by periods, but preserve non-empty segments
-    parts = re.split(r"\.\s*", original)
-    parts = [clean_spaces(p) for p in parts if p.strip()]
+    parts = [clean_spaces(p) for p in SENTENCE_SPLIT.split(original)]
+    parts = [p for p in parts if p]
 
     merged = []
     buffer = ""
@@ -96,35 +122,196 @@ def segment_line(line: str):
 # MAIN CLEANER
 # -------------------------
 
-def prepare_corpus(input_file, output_file):
-    input_file = Path(input_file)
-    output_file = Path(output_file)
+def clean_line(raw_line: str) -> List[str]:
+    """Segments of one raw line that are kept for the corpus (cleaned and lowercased)."""
+    segments = []
+    for seg in segment_line(raw_line):
+        # segment_line already normalized spacing
+        seg = normalize_case(seg)
 
-    output_file.parent.mkdir(parents=True, exist_ok=True)
+        # Filter out too-short lines
+        if len(seg.split()) < 3:
+            continue
+
+        segments.append(seg)
+    return segments
 
-    with input_file.open("r", encoding="utf-8") as fin, \
-         output_file.open("w", encoding="utf-8") as fout:
 
+def clean_chunk(lines: List[str]) -> List[str]:
+    return [seg for line in lines for seg in clean_line(line)]
+
+
+def read_chunks(input_file: Path, chunk_size: int) -> Iterator[List[str]]:
+    chunk = []
+    with input_file.open("r", encoding="utf-8") as fin:
         for raw_line in fin:
-            raw_line = raw_line.strip()
-            if not raw_line:
+            if not raw_line.strip():
                 continue
+            chunk.append(raw_line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _cleaned_chunks(chunks: Iterator[List[str]], processes: int) -> Iterator[List[str]]:
+    """Clean chunks in input order; with several processes keep a bounded window in flight."""
+    if processes <= 1:
+        for chunk in chunks:
+            yield clean_chunk(chunk)
+        return
+    with Pool(processes=processes) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(clean_chunk, (chunk,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def near_duplicate_key(seg: str) -> str:
+    return " ".join(NEAR_DUP_PUNCT.sub(" ", NEAR_DUP_DIGITS.sub("0", seg)).split())
+
+
+class SegmentDeduper:
+    """
+    Counts segments in an open-addressing table of 8-byte digests (not the text) with 4-byte
+    counts, so a distinct segment costs about 16 bytes. The table grows up to `max_mb`; once it
+    is full, segments not seen before are no longer remembered and are written every time they
+    occur, each with a count of 1, so the counts still add up. A digest collision would merge two
+    segments, which at 64 bits is negligible for corpora of this size.
+    """
 
-            segments = segment_line(raw_line)
+    _MIN_SLOTS = 1 << 16
+    _LOAD = 0.75
+
+    def __init__(self, near_duplicates: bool = False, max_mb: int = 512):
+        self.near_duplicates = near_duplicates
+        self.max_slots = max(self._MIN_SLOTS, 1 << ((max(max_mb, 1) * 1024 * 1024 // 12).bit_length() - 1))
+        self.size = 0
+        # Segments written without being remembered because the table was full
+        self.untracked = 0
+        self._alloc(min(self._MIN_SLOTS, self.max_slots))
+
+    def _alloc(self, slots: int) -> None:
+        self.digests = array("Q", bytes(8 * slots))
+        self.counts = array("I", bytes(4 * slots))
+        self.mask = slots - 1
+
+    def _digest(self, seg: str) -> int:
+        key = near_duplicate_key(seg) if self.near_duplicates else seg
+        # 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+    def _slot(self, digest: int) -> int:
+        i = digest & self.mask
+        while self.digests[i] and self.digests[i] != digest:
+            i = (i + 1) & self.mask
+        return i
+
+    def _grow(self) -> None:
+        digests, counts = self.digests, self.counts
+        self._alloc(len(digests) * 2)
+        for digest, count in zip(digests, counts):
+            if digest:
+                i = self._slot(digest)
+                self.digests[i] = digest
+                self.counts[i] = count
+
+    def add(self, seg: str) -> bool:
+        """Count the segment; True if it is the first of its kind and should be written."""
+        digest = self._digest(seg)
+        i = self._slot(digest)
+        if self.digests[i]:
+            self.counts[i] += 1
+            return False
+        if self.size + 1 > self._LOAD * len(self.digests):
+            if len(self.digests) >= self.max_slots:
+                self.untracked += 1
+                return True
+            self._grow()
+            i = self._slot(digest)
+        self.digests[i] = digest
+        self.counts[i] = 1
+        self.size += 1
+        return True
+
+    def count(self, seg: str) -> int:
+        """How often a written segment occurred (1 for segments written after the table filled)."""
+        i = self._slot(self._digest(seg))
+        return self.counts[i] if self.digests[i] else 1
+
+
+def counts_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.name + ".counts.tsv")
+
+
+def prepare_corpus(
+    input_file,
+    output_file,
+    processes: int = 1,
+    chunk_size: int = 2000,
+    dedup: bool = True,
+    near_duplicates: bool = False,
+    dedup_memory_mb: int = 512,
+):
+    input_file = Path(input_file)
+    output_file = Path(output_file)
 
-            for seg in segments:
-                seg = clean_spaces(seg)
-                seg = normalize_case(seg)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
 
-                # Filter out too-short lines
-                if len(seg.split()) < 3:
-                    continue
+    # Counts from an earlier run describe the old corpus; without dedup nothing replaces them
+    counts_path(output_file).unlink(missing_ok=True)
 
-                fout.write(seg + "\n")
+    deduper = SegmentDeduper(near_duplicates=near_duplicates, max_mb=dedup_memory_mb) if dedup else None
+    total = written = 0
+    with output_file.open("w", encoding="utf-8") as fout:
+        for segments in _cleaned_chunks(read_chunks(input_file, chunk_size), processes):
+            for seg in segments:
+                total += 1
+                if deduper is None or deduper.add(seg):
+                    fout.write(seg + "\n")
+                    written += 1
+
+    if deduper is not None:
+        # The table only holds digests, so look every written segment up again on a second pass
+        with output_file.open("r", encoding="utf-8") as fin, counts_path(output_file).open("w", encoding="utf-8") as fcounts:
+            for line in fin:
+                seg = line.rstrip("\n")
+                fcounts.write(f"{seg.rstrip()}\t{deduper.count(seg)}\n")
+        print(f"{total} segments, {written} unique → counts in {counts_path(output_file)}")
+        if deduper.untracked:
+            print(
+                f"Dedup table full at --dedup-memory-mb {dedup_memory_mb}: "
+                f"{deduper.untracked} segments were written without deduplication"
+            )
 
     print(f"Domain-aware LM corpus written → {output_file}")
 
-if __name__ == "__main__":
+
+def main():
+    parser = argparse.ArgumentParser(description="Segment, clean and deduplicate the raw work-order dump")
+    parser.add_argument("--input", default="data/raw/large_training_text.txt")
+    parser.add_argument("--output", default="data/lm/lm_corpus.txt")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes for cleaning")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Raw lines per worker task")
+    parser.add_argument("--keep-duplicates", action="store_true", help="Write every segment, no counts file")
+    parser.add_argument("--near-duplicates", action="store_true", help="Also merge segments differing only in digits/punctuation")
+    parser.add_argument("--dedup-memory-mb", type=int, default=512, help="Memory cap for the dedup table (about 16 bytes per distinct segment)")
+    args = parser.parse_args()
+
     prepare_corpus(
-        input_file="data/raw/large_training_text.txt",
-        output_file="data/lm/lm_corpus.txt")
\ No newline at end of file
+        input_file=args.input,
+        output_file=args.output,
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        dedup=not args.keep_duplicates,
+        near_duplicates=args.near_duplicates,
+        dedup_memory_mb=args.dedup_memory_mb,
+    )
+
+
+if __name__ == "__main__":
+    main()
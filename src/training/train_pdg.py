@@ -1,15 +1,57 @@
+"""
+Train the probabilistic dependency grammar (PDG) from a parsed corpus.
+
+Usage:
+    python -m src.training.train_pdg --corpus data/lm/lm_corpus.txt --output data/pdg/grammar_stats.json --processes 8
+
+The corpus is split into shards at line boundaries. Each shard is parsed in a worker process
+and produces partial (head_pos, dep, child_pos) and (head_pos, dep) counts. Counts merge by
+addition, so shards can be processed in any order. With --work-dir the partial counts are
+written per shard and an interrupted run resumes with the shards that are still missing. A shard
+is only reused when it was counted from the same corpus file (path, size and modification time)
+with the same model and --weighted setting; other shards are counted again.
+
+With --parse-cache, workers share a persistent parse cache (see src/nlp/parse_cache.py), so a
+rerun over mostly unchanged text skips parsing what it has already seen.
+
+The output keeps the raw triple and (head_pos, dep) counts next to the probabilities, so
+accepted corrections can be added later without retraining (`add_counts`,
+src/models/online_updates.py).
+
+With --weighted the corpus is a "segment<TAB>count" file (the .counts.tsv written by
+prepare_lm_courpus_domain): each distinct segment is parsed once and counted `count` times.
+"""
+
+import argparse
+import itertools
 import json
-from collections import Counter, defaultdict
-import spacy
+import os
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Ensure project root on sys.path so `python src/training/train_pdg.py` works
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
 
-# Load Danish spaCy model (install via: python -m spacy download da_core_news_sm)
-nlp = spacy.load("da_core_news_sm")
+from src.nlp import spacy_pipeline
 
-def read_in_chunks(filepath, chunk_size=500):
+DEFAULT_MODEL = "da_core_news_sm"  # install via: python -m spacy download da_core_news_sm
+
+def read_in_chunks(filepath, chunk_size=500, start: int = 0, end: Optional[int] = None):
+    """Yield lists of non-empty lines, optionally limited to the byte range [start, end)."""
     chunk = []
-    with open(filepath, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        while end is None or f.tell() < end:
+            raw = f.readline()
+            if not raw:
+                break
+            line = raw.decode("utf-8").strip()
             if not line:
                 continue
             chunk.append(line)
@@ -19,23 +61,93 @@ def read_in_chunks(filepath, chunk_size=500):
         if chunk:
             yield chunk
 
-def train_pdg(corpus_path, chunk_size=500):
+
+def shard_bounds(filepath, n_shards: int) -> List[Tuple[int, int]]:
+    """Split the file into byte ranges of roughly equal size, each starting at a line start."""
+    size = os.path.getsize(filepath)
+    n_shards = max(1, min(n_shards, size or 1))
+    cuts = [0]
+    with open(filepath, "rb") as f:
+        for i in range(1, n_shards):
+            f.seek(max(size * i // n_shards, cuts[-1]))
+            f.readline()
+            cuts.append(min(f.tell(), size))
+    cuts.append(size)
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+
+def count_docs(docs, weights=None) -> Tuple[Counter, Counter, int]:
+    """Count dependency triples; `weights` (one per doc) count a doc several times."""
     # counts of (head_pos, dep, child_pos) triples
     triple_counts = Counter()
     # counts of (head_pos, dep) for normalization
     head_dep_counts = Counter()
+    n_docs = 0
+
+    for doc, weight in zip(docs, weights or itertools.repeat(1)):
+        n_docs += weight
+        for tok in doc:
+            head_pos = tok.head.pos_
+            dep = tok.dep_
+            child_pos = tok.pos_
+
+            triple = (head_pos, dep, child_pos)
+            triple_counts[triple] += weight
+            head_dep_counts[(head_pos, dep)] += weight
+
+    return triple_counts, head_dep_counts, n_docs
 
-    for chunk in read_in_chunks(corpus_path, chunk_size):
-        for doc in nlp.pipe(chunk):
-            for tok in doc:
-                head_pos = tok.head.pos_
-                dep = tok.dep_
-                child_pos = tok.pos_
 
-                triple = (head_pos, dep, child_pos)
-                triple_counts[triple] += 1
-                head_dep_counts[(head_pos, dep)] += 1
+def _init_worker(model_name: str, max_memory_mb: Optional[int], parse_cache: Optional[str] = None):
+    if max_memory_mb:
+        try:
+            import resource
 
+            limit = max_memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError):
+            pass  # not supported on this platform
+    spacy_pipeline.configure(backbone=model_name, parse_cache=parse_cache)
+    spacy_pipeline.get_nlp()
+
+
+def _count_shard(task) -> Dict[str, object]:
+    index, corpus_path, start, end, chunk_size, batch_size, weighted = task
+    began = time.perf_counter()
+    triple_counts, head_dep_counts, n_docs = Counter(), Counter(), 0
+    for chunk in read_in_chunks(corpus_path, chunk_size, start=start, end=end):
+        weights = None
+        if weighted:
+            rows = [line.rpartition("\t") for line in chunk]
+            chunk = [text for text, _, _ in rows]
+            weights = [int(count) for _, _, count in rows]
+        t, hd, n = count_docs(spacy_pipeline.parse_many(chunk, batch_size=batch_size), weights)
+        triple_counts.update(t)
+        head_dep_counts.update(hd)
+        n_docs += n
+    return {
+        "shard": index,
+        "start": start,
+        "end": end,
+        "sentences": n_docs,
+        "seconds": time.perf_counter() - began,
+        "triple_counts": {f"{h}|{d}|{c}": cnt for (h, d, c), cnt in triple_counts.items()},
+        "head_dep_counts": {f"{h}|{d}": cnt for (h, d), cnt in head_dep_counts.items()},
+    }
+
+
+def merge_counts(partials) -> Tuple[Counter, Counter]:
+    """Add up partial shard counts; the order of partials does not matter."""
+    triple_counts, head_dep_counts = Counter(), Counter()
+    for part in partials:
+        for key, cnt in part["triple_counts"].items():
+            triple_counts[tuple(key.split("|"))] += cnt
+        for key, cnt in part["head_dep_counts"].items():
+            head_dep_counts[tuple(key.split("|"))] += cnt
+    return triple_counts, head_dep_counts
+
+
+def build_model(triple_counts: Counter, head_dep_counts: Counter) -> Dict[str, object]:
     # convert to probabilities
     probs = {}
     for (head_pos, dep, child_pos), count in triple_counts.items():
@@ -48,11 +160,195 @@ def train_pdg(corpus_path, chunk_size=500):
         "probs": probs,
     }
 
+
+def _shard_file(work_dir: Path, index: int) -> Path:
+    return work_dir / f"shard-{index:05d}.json"
+
+
+def _shard_source(corpus_path, model_name: str, weighted: bool) -> Dict[str, object]:
+    """What a shard's counts depend on besides its byte range."""
+    path = Path(corpus_path).resolve()
+    st = path.stat()
+    return {
+        "corpus": str(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "model": model_name,
+        "weighted": weighted,
+    }
+
+
+def _load_done_shard(
+    work_dir: Path, index: int, start: int, end: int, source: Dict[str, object]
+) -> Optional[Dict[str, object]]:
+    path = _shard_file(work_dir, index)
+    if not path.exists():
+        return None
+    try:
+        part = json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return None
+    # Only reuse a shard produced for the same byte range of the same corpus, counted the same way
+    if part.get("start") != start or part.get("end") != end or part.get("source") != source:
+        print(f"Discarding {path.name}: counted from another corpus version or with other options")
+        return None
+    return part
+
+
+def _save_shard(work_dir: Path, part: Dict[str, object]) -> None:
+    path = _shard_file(work_dir, part["shard"])
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(part, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _run_shards(
+    tasks,
+    n_process: int,
+    model_name: str,
+    max_memory_mb: Optional[int],
+    tasks_per_child: Optional[int],
+    parse_cache: Optional[str] = None,
+) -> Iterator[Dict[str, object]]:
+    if n_process <= 1:
+        _init_worker(model_name, None, parse_cache)
+        for task in tasks:
+            yield _count_shard(task)
+        return
+    with Pool(
+        processes=n_process,
+        initializer=_init_worker,
+        initargs=(model_name, max_memory_mb, parse_cache),
+        maxtasksperchild=tasks_per_child,
+    ) as pool:
+        yield from pool.imap_unordered(_count_shard, tasks)
+
+
+def train_pdg(
+    corpus_path,
+    chunk_size=500,
+    n_process: int = 1,
+    n_shards: Optional[int] = None,
+    batch_size: int = 64,
+    work_dir: Optional[str] = None,
+    model_name: str = DEFAULT_MODEL,
+    max_memory_mb: Optional[int] = None,
+    tasks_per_child: Optional[int] = None,
+    weighted: bool = False,
+    parse_cache: Optional[str] = None,
+):
+    """
+    Parse the corpus and return PDG counts and probabilities.
+
+    n_process: worker processes, each with its own spaCy pipeline.
+    n_shards: number of corpus shards (default: 4 per process, so work balances out).
+    work_dir: where per-shard counts are kept; existing shards are reused on rerun.
+    max_memory_mb: address-space cap per worker (POSIX only).
+    tasks_per_child: recycle workers after this many shards to bound memory growth.
+    weighted: corpus lines are "segment<TAB>count" and each segment counts `count` times.
+    parse_cache: SQLite parse cache shared by the workers (default: STDTEXT_PARSE_CACHE, if set).
+    """
+    n_process = max(1, n_process)
+    bounds = shard_bounds(corpus_path, n_shards or n_process * 4)
+    work = Path(work_dir) if work_dir else None
+    if work:
+        work.mkdir(parents=True, exist_ok=True)
+
+    source = _shard_source(corpus_path, model_name, weighted)
+    partials = []
+    tasks = []
+    for index, (start, end) in enumerate(bounds):
+        done = _load_done_shard(work, index, start, end, source) if work else None
+        if done is not None:
+            partials.append(done)
+        else:
+            tasks.append((index, str(corpus_path), start, end, chunk_size, batch_size, weighted))
+    if partials:
+        print(f"Resuming: {len(partials)}/{len(bounds)} shards already counted")
+
+    began = time.perf_counter()
+    sentences = 0
+    for part in _run_shards(tasks, n_process, model_name, max_memory_mb, tasks_per_child, parse_cache):
+        if work:
+            _save_shard(work, {**part, "source": source})
+        partials.append(part)
+        sentences += part["sentences"]
+        elapsed = time.perf_counter() - began
+        print(
+            f"shard {part['shard'] + 1}/{len(bounds)} done: "
+            f"{sentences} sentences, {sentences / max(elapsed, 1e-9):.1f} sentences/s"
+        )
+
+    triple_counts, head_dep_counts = merge_counts(partials)
+    return build_model(triple_counts, head_dep_counts)
+
+
 def save_pdg(model, outfile="grammar_stats.json"):
-    with open(outfile, "w", encoding="utf-8") as f:
+    # Write then rename: a service reloading the model never reads a half-written file
+    tmp = Path(f"{outfile}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(model, f, ensure_ascii=False, indent=2)
+    tmp.replace(outfile)
+
+
+def load_pdg(path) -> Dict[str, object]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def add_counts(model: Dict[str, object], triple_counts: Counter) -> Dict[str, object]:
+    """
+    A model with `triple_counts` added to its raw counts and the probabilities rebuilt.
+    Keys other than the counts and probabilities (e.g. "applied_seq") are carried over.
+    """
+    triples, head_dep = merge_counts([model])
+    for (head_pos, dep, child_pos), count in triple_counts.items():
+        triples[(head_pos, dep, child_pos)] += count
+        head_dep[(head_pos, dep)] += count
+    updated = {key: value for key, value in model.items() if key not in ("triple_counts", "head_dep_counts", "probs")}
+    updated.update(build_model(triples, head_dep))
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train PDG statistics from a corpus")
+    parser.add_argument("--corpus", default="data/lm/lm_corpus.txt")
+    parser.add_argument("--output", default="data/pdg/grammar_stats.json")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes")
+    parser.add_argument("--shards", type=int, default=None, help="Corpus shards (default: 4 per process)")
+    parser.add_argument("--batch-size", type=int, default=64, help="nlp.pipe batch size")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Lines read per nlp.pipe call")
+    parser.add_argument("--work-dir", default=None, help="Keep per-shard counts here to allow resuming")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="spaCy pipeline used for parsing")
+    parser.add_argument("--max-memory-mb", type=int, default=None, help="Address-space cap per worker")
+    parser.add_argument("--tasks-per-child", type=int, default=None, help="Recycle workers after N shards")
+    parser.add_argument("--parse-cache", default=None, help="Persistent parse cache file shared by the workers")
+    parser.add_argument("--weighted", action="store_true", help="Corpus is a segment<TAB>count file")
+    parser.add_argument("--compiled", default=None, help="Also write a binary PDG table (.npz) here")
+    args = parser.parse_args()
+
+    pdg = train_pdg(
+        args.corpus,
+        chunk_size=args.chunk_size,
+        n_process=args.processes,
+        n_shards=args.shards,
+        batch_size=args.batch_size,
+        work_dir=args.work_dir,
+        model_name=args.model,
+        max_memory_mb=args.max_memory_mb,
+        tasks_per_child=args.tasks_per_child,
+        weighted=args.weighted,
+        parse_cache=args.parse_cache,
+    )
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    save_pdg(pdg, args.output)
+    print(f"PDG training done → {args.output}")
+    if args.compiled:
+        from src.models.pdg_table import PDGTable
+
+        PDGTable.from_model(pdg).save(args.compiled)
+        print(f"Compiled PDG table → {args.compiled}")
+
 
 if __name__ == "__main__":
-    pdg = train_pdg("data/lm/lm_corpus.txt")
-    save_pdg(pdg, "data/pdg/grammar_stats.json")
-    print("PDG training done → grammar_stats.json")
+    main()
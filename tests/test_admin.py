@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+
+from src.api.admin import require_admin
+
+
+@pytest.mark.parametrize("token", [None, "", "secret"])
+def test_refused_without_configured_token(token):
+    with pytest.raises(HTTPException) as exc:
+        require_admin(token, None)
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.parametrize("token", [None, "", "wrong"])
+def test_refused_with_wrong_token(token):
+    with pytest.raises(HTTPException) as exc:
+        require_admin(token, "secret")
+    assert exc.value.status_code == 403
+
+
+def test_accepted_with_matching_token():
+    require_admin("secret", "secret")
@@ -0,0 +1,131 @@
+"""
+SpellChecker.correct against the list-of-dicts implementation it replaced.
+
+`reference_correct` is a frozen copy of SpellChecker._correct from before corrections were built
+on parallel token arrays. It reads the Doc token by token, builds per-token dicts, and moves
+"installation" by popping and prepending, as the old code did. Both sides get their candidates
+from `_generate_inflection_candidates` and pick a path with `LatticeScorer.best_path`; that
+change did not touch either. Runs on the artifacts in data/lm.
+"""
+
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+pytest.importorskip("kenlm")
+pytest.importorskip("spacy")
+
+DATA = Path(__file__).resolve().parents[1] / "data" / "lm"
+CORPUS = DATA / "lm_corpus.txt"
+LM = DATA / "my_corpus.bin"
+LEMMAS = DATA / "lemmas.json"
+
+if not (CORPUS.exists() and LM.exists()):
+    pytest.skip("data/lm artifacts are missing", allow_module_level=True)
+
+SENTENCES = [
+    # As written in the corpus
+    "montering af spots",
+    "opsætning af istapper på facade",
+    "fejlfinding på blæser på toilet",
+    "udskiftning af transformer til lys på toilet",
+    "montering af ny installationer i stueplan udskiftning af tavle",
+    "pakning, opsætning samt nedtagning til b&o fest i struer",
+    "etablering af lampesteder, opsætning og tilslutning af lamper",
+    "jægerparken, dalgasallé 125, lejl : 592 rekv 2395 montering af lampe under køkkenskabe",
+    # Typos, abbreviations and number agreement
+    "monterng af spost",
+    "udskiftnig af stikontakt i køken",
+    "fejlfinnding på blæsr på toilett",
+    "etabl af lampested samt afb",
+    "tilslutning af komfur og opvaskemaskne",
+    "opsætnig af 3 lampe i gangen",
+    "2 lamper i køkkenet og 1 lampe på badeværelset",
+    "Montering Af Nye Kanaler",
+    "INSTALLATION AFPRØVET",
+    "udskiftning af stik på frysere,afbrydere samt stikkontakter",
+    "  flere   mellemrum  og tabulator\tog linjeskift\n",
+    "",
+    # The "installation" reorder heuristic
+    "2 lampe installation",
+    "2 af installation køkken",
+    "installation af 2 lamper",
+    "3 stk stikkontakt monteret installation",
+    "4 lamper installation  ",
+    "1 installation",
+    "5 instal",
+]
+
+
+def reference_correct(spellchecker, doc) -> Dict[str, object]:
+    lattice = []
+    for tok in doc:
+        prev_like_num = tok.i > 0 and doc[tok.i - 1].like_num
+        candidates = spellchecker._generate_inflection_candidates(tok.text, prev_like_num=prev_like_num)
+        lattice.append((candidates, tok.whitespace_))
+
+    if spellchecker.lattice_scorer:
+        choices, _ = spellchecker.lattice_scorer.best_path(lattice)
+    else:
+        choices = [candidates[-1] for candidates, _ in lattice]
+
+    corrected_tokens: List[Dict[str, str]] = []
+    corrections: List[Dict[str, object]] = []
+
+    for tok, best in zip(doc, choices):
+        corrected_tokens.append({"text": best, "ws": tok.whitespace_})
+
+        if best != tok.text:
+            corrections.append(
+                {
+                    "original": tok.text,
+                    "suggestion": best,
+                    "position": tok.i,
+                }
+            )
+
+    if corrected_tokens:
+        first_is_num = doc[0].like_num
+        install_idx = next(
+            (i for i, t in enumerate(corrected_tokens) if t["text"].lower() == "installation"),
+            None,
+        )
+        if first_is_num and install_idx not in (None, 0):
+            install_token = corrected_tokens.pop(install_idx)
+            install_token["ws"] = install_token.get("ws", " ") or " "
+            needs_af = not corrected_tokens or corrected_tokens[0]["text"].lower() != "af"
+            prefix = [install_token]
+            if needs_af:
+                prefix.append({"text": "af", "ws": " "})
+            corrected_tokens = prefix + corrected_tokens
+
+    corrected_sentence = "".join([t["text"] + t["ws"] for t in corrected_tokens])
+    return {
+        "corrected_sentence": corrected_sentence,
+        "corrections": corrections,
+    }
+
+
+@pytest.fixture(scope="module")
+def spellchecker():
+    from src.models.spellchecker import SpellChecker
+
+    # The reference generates candidates for every token, so compare without the fast path
+    return SpellChecker(
+        str(CORPUS),
+        cutoff=0.82,
+        lm_path=str(LM),
+        lemma_path=str(LEMMAS) if LEMMAS.exists() else None,
+        fast_path=False,
+    )
+
+
+@pytest.mark.parametrize("sentence", SENTENCES)
+def test_correct_matches_reference(spellchecker, sentence):
+    from src.nlp.spacy_pipeline import tokenize
+
+    got = spellchecker.correct(sentence)
+    expected = reference_correct(spellchecker, tokenize(sentence))
+    assert got["corrected_sentence"] == expected["corrected_sentence"]
+    assert got["corrections"] == expected["corrections"]
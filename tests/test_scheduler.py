@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.api.scheduler import InferenceScheduler, QueueFullError
+
+
+class FakeModel:
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def score_batch(self, texts, autocorrect=True, timings=False):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append(list(texts))
+        return [{"sentence": text} for text in texts]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_large_request_is_split_into_max_batch_jobs():
+    async def main():
+        model = FakeModel()
+        scheduler = InferenceScheduler(model, max_queue=16, max_batch=8, batch_window_ms=1)
+        await scheduler.start()
+        texts = [f"sætning {i}" for i in range(100)]
+        results = await scheduler.submit_many(texts)
+        await scheduler.stop()
+        return model, texts, results
+
+    model, texts, results = run(main())
+    assert [r["sentence"] for r in results] == texts
+    assert max(len(batch) for batch in model.batches) <= 8
+
+
+def test_micro_batches_never_exceed_max_batch():
+    async def main():
+        model = FakeModel()
+        scheduler = InferenceScheduler(model, max_queue=64, max_batch=5, batch_window_ms=20)
+        await scheduler.start()
+        requests = [[f"{n}-{i}" for i in range(n)] for n in (3, 4, 2, 5, 1, 3)]
+        results = await asyncio.gather(*(scheduler.submit_many(texts) for texts in requests))
+        await scheduler.stop()
+        return model, requests, results
+
+    model, requests, results = run(main())
+    assert [[r["sentence"] for r in result] for result in results] == requests
+    assert max(len(batch) for batch in model.batches) <= 5
+
+
+def test_queue_bound_counts_the_jobs_of_a_large_request():
+    gate = threading.Event()
+
+    async def main():
+        scheduler = InferenceScheduler(FakeModel(gate), workers=1, max_queue=4, max_batch=10, batch_window_ms=1)
+        await scheduler.start()
+        try:
+            # 50 texts need 5 jobs, more than the queue holds
+            with pytest.raises(QueueFullError):
+                await scheduler.submit_many([str(i) for i in range(50)])
+            assert scheduler.qsize() == 0
+            pending = asyncio.ensure_future(scheduler.submit_many([str(i) for i in range(40)]))
+            await asyncio.sleep(0.05)
+            # One job is running; the three still queued leave room for one more
+            with pytest.raises(QueueFullError):
+                await scheduler.submit_many([str(i) for i in range(11)])
+        finally:
+            gate.set()
+        results = await pending
+        await scheduler.stop()
+        return results
+
+    assert len(run(main())) == 40
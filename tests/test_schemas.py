@@ -0,0 +1,13 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+from pydantic import ValidationError
+
+from src.api.schemas import MAX_BATCH_TEXTS, BatchSentenceRequest
+
+
+def test_batch_request_is_capped():
+    BatchSentenceRequest(texts=["tekst"] * MAX_BATCH_TEXTS)
+    with pytest.raises(ValidationError):
+        BatchSentenceRequest(texts=["tekst"] * (MAX_BATCH_TEXTS + 1))
@@ -0,0 +1,51 @@
+"""
+SymSpellIndex against the difflib scan it replaced, on the committed sample in
+tests/data/symspell_parity.tsv (regenerate with `python -m src.models.symspell --write-sample`).
+"""
+
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+
+from src.models.symspell import SymSpellIndex, _ratio, corpus_vocab
+
+ROOT = Path(__file__).resolve().parents[1]
+CORPUS = ROOT / "data" / "lm" / "lm_corpus.txt"
+SAMPLE = ROOT / "tests" / "data" / "symspell_parity.tsv"
+
+# Share of queries per kind allowed a worse match than difflib (see the symspell docstring)
+MAX_WORSE = {"single_edit": 0.0, "three_edits": 0.01, "truncated": 0.01}
+
+if not CORPUS.exists():
+    pytest.skip("data/lm/lm_corpus.txt is missing", allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def results():
+    vocab = corpus_vocab(str(CORPUS))
+    index = SymSpellIndex(vocab)
+    by_kind = defaultdict(list)
+    with SAMPLE.open("r", encoding="utf-8") as f:
+        for line in f:
+            kind, query, expected = line.rstrip("\n").split("\t")
+            got = index.lookup(query, cutoff=0.6, n=1)
+            by_kind[kind].append((query, expected, got[0] if got else ""))
+    return index, by_kind
+
+
+def test_index_finds_a_match_whenever_difflib_does(results):
+    _, by_kind = results
+    missing = [(q, e) for rows in by_kind.values() for q, e, got in rows if e and not got]
+    assert missing == []
+
+
+@pytest.mark.parametrize("kind", sorted(MAX_WORSE))
+def test_worse_matches_are_rare_and_close(results, kind):
+    index, by_kind = results
+    rows = by_kind[kind]
+    assert rows
+    worse = [(q, e, got) for q, e, got in rows if e and got and _ratio(q, got) < _ratio(q, e)]
+    assert len(worse) <= MAX_WORSE[kind] * len(rows), worse
+    # The index only skips the scan when its own match is already this similar
+    assert all(_ratio(q, got) >= index.scan_below for q, _, got in worse), worse